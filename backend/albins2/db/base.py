@@ -0,0 +1,32 @@
+"""
+PostgreSQL backend that borrows connections from a process-wide pool.
+
+Select it with ``'ENGINE': 'albins2.db'`` and keep ``CONN_MAX_AGE`` at 0:
+Django then "closes" the connection at the end of every request, which hands
+it back to the pool instead of tearing down the TCP session. Pool limits come
+from the ``POOL`` dict of the database settings (see ConnectionPool).
+"""
+
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+
+from .creation import DatabaseCreation
+from .pool import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def get_new_connection(self, conn_params):
+        self.pool = get_pool(self.alias, conn_params, self.settings_dict.get("POOL", {}))
+        connection = self.pool.getconn(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+        # The parent only sets this when it actually opens a connection.
+        self.isolation_level = IsolationLevel(
+            self.settings_dict["OPTIONS"].get("isolation_level", IsolationLevel.READ_COMMITTED)
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.putconn(self.connection)
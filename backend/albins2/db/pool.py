@@ -0,0 +1,197 @@
+"""Process-wide pool of PostgreSQL connections shared by Django's per-thread wrappers."""
+
+import threading
+import time
+from collections import deque
+
+from django.db import OperationalError
+
+# psycopg2.extensions.TRANSACTION_STATUS_IDLE
+TRANSACTION_STATUS_IDLE = 0
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class ConnectionPool:
+    """
+    Bounded pool handing out open DB-API connections.
+
+    At most ``max_size`` connections exist at once; callers wait up to
+    ``timeout`` seconds for one to be returned. Idle connections are checked
+    with ``SELECT 1`` before reuse once they have been idle for
+    ``check_after`` seconds and are replaced after ``max_lifetime`` seconds.
+    """
+
+    def __init__(self, max_size=10, timeout=5.0, check_after=30.0, max_lifetime=3600.0, label=""):
+        self.label = label
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_after = check_after
+        self.max_lifetime = max_lifetime
+
+        self._condition = threading.Condition()
+        self._idle = deque()
+        self._opened_at = {}
+        self._in_use = 0
+        self._size = 0
+        self._counters = {"connects": 0, "waits": 0, "wait_seconds": 0.0, "timeouts": 0, "errors": 0}
+
+    def getconn(self, connect):
+        """Return a pooled connection, calling ``connect()`` when a new one may be opened."""
+        started = time.monotonic()
+        waited = False
+        try:
+            while True:
+                connection, idle_since, waited = self._checkout(started, waited)
+                if connection is None:
+                    return self._open(connect)
+                if self._healthy(connection, idle_since):
+                    return connection
+                self._discard(connection, error=True)
+        finally:
+            if waited:
+                with self._condition:
+                    self._counters["wait_seconds"] += time.monotonic() - started
+
+    def putconn(self, connection):
+        """Give a connection back, dropping it when it is broken or too old."""
+        try:
+            reusable = not connection.closed
+            if reusable and connection.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except Exception:
+            reusable = False
+
+        if not reusable:
+            self._discard(connection, error=True)
+        elif time.monotonic() - self._opened_at.get(connection, 0) > self.max_lifetime:
+            self._discard(connection)
+        else:
+            with self._condition:
+                self._in_use -= 1
+                self._idle.append((connection, time.monotonic()))
+                self._condition.notify()
+
+    def close_idle(self):
+        with self._condition:
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+        for connection, _ in idle:
+            self._opened_at.pop(connection, None)
+            self._close_quietly(connection)
+
+    def stats(self):
+        with self._condition:
+            return {
+                "pool": self.label,
+                "max_size": self.max_size,
+                "size": self._size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                **self._counters,
+            }
+
+    def _checkout(self, started, waited):
+        """
+        Reserve an idle connection, or a slot for a new one (returned as ``None``).
+
+        Also returns whether this checkout had to wait; a wait is counted once.
+        """
+        with self._condition:
+            while True:
+                if self._idle:
+                    connection, idle_since = self._idle.pop()
+                    self._in_use += 1
+                    return connection, idle_since, waited
+                if self._size < self.max_size:
+                    self._size += 1
+                    self._in_use += 1
+                    return None, None, waited
+
+                remaining = self.timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self._counters["timeouts"] += 1
+                    raise PoolTimeout(f"No database connection became free within {self.timeout} seconds.")
+                if not waited:
+                    self._counters["waits"] += 1
+                    waited = True
+                self._condition.wait(remaining)
+
+    def _open(self, connect):
+        try:
+            connection = connect()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._in_use -= 1
+                self._counters["errors"] += 1
+                self._condition.notify()
+            raise
+
+        with self._condition:
+            self._opened_at[connection] = time.monotonic()
+            self._counters["connects"] += 1
+        return connection
+
+    def _healthy(self, connection, idle_since):
+        if connection.closed:
+            return False
+        if time.monotonic() - self._opened_at.get(connection, 0) > self.max_lifetime:
+            return False
+        if time.monotonic() - idle_since < self.check_after:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            if connection.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, connection, error=False):
+        self._opened_at.pop(connection, None)
+        self._close_quietly(connection)
+        with self._condition:
+            self._size -= 1
+            self._in_use -= 1
+            if error:
+                self._counters["errors"] += 1
+            self._condition.notify()
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+def get_pool(alias, conn_params, options):
+    """Return the pool for a database alias, one per distinct set of connection parameters."""
+    key = (alias, tuple(sorted((name, repr(value)) for name, value in conn_params.items())))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            label = f"{alias}:{conn_params.get('dbname') or conn_params.get('database', '')}"
+            pool = _pools[key] = ConnectionPool(label=label, **options)
+        return pool
+
+
+def pool_stats():
+    """Statistics of every pool in this process."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.stats() for pool in pools]
+
+
+def close_idle_connections():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_idle()
@@ -0,0 +1,102 @@
+"""
+Prometheus metrics for the API, served at ``/api/metrics``.
+
+Metrics are kept with prometheus_client. When PROMETHEUS_MULTIPROC_DIR is
+set (gunicorn.conf.py does this) every worker writes its samples to
+memory-mapped files in that directory and a scrape adds up all workers;
+otherwise they live in process memory.
+"""
+
+import os
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+from .timing import enable_query_recording, request_url_name, timed_request
+
+# Anything else is counted as "other" so that odd methods cannot add label values.
+METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_LATENCY = Histogram(
+    "albins_http_request_duration_seconds",
+    "Time spent answering requests, by URL name.",
+    ["view", "method"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS = Counter("albins_http_requests", "Answered requests, by URL name and status.", ["view", "method", "status"])
+DB_QUERIES = Counter("albins_db_queries", "SQL queries run while answering requests, by URL name.", ["view"])
+DB_QUERY_SECONDS = Counter(
+    "albins_db_query_seconds", "Time spent in SQL queries while answering requests, by URL name.", ["view"]
+)
+TOKENS_ISSUED = Counter("albins_tokens_issued", "Auth tokens handed out, by kind.", ["kind"])
+TOKENS_EXPIRED = Counter("albins_tokens_expired", "Expired auth tokens presented by clients, by kind.", ["kind"])
+THROTTLE_DENIALS = Counter("albins_throttle_denials", "Requests rejected by rate limiting, by scope.", ["scope"])
+CACHE_LOOKUPS = Counter("albins_cache_lookups", "Cache lookups, by cache and hit or miss.", ["cache", "result"])
+
+
+def record_cache_lookup(cache, hit):
+    CACHE_LOOKUPS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+def metrics_registry():
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_view(request):
+    """
+    Prometheus text exposition of every worker's metrics.
+
+    A plain Django view: scrapes skip DRF authentication and throttling.
+    nginx keeps it off the public site, so scrape the api service directly.
+    """
+    return HttpResponse(generate_latest(metrics_registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+class MetricsMiddleware:
+    """Count requests, their latency and their SQL queries per URL name; disabled with METRICS_ENABLED."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        enable_query_recording()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with timed_request() as timing:
+            response = self.get_response(request)
+        self.observe(request, response, timing, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with timed_request() as timing:
+            response = await self.get_response(request)
+        self.observe(request, response, timing, time.perf_counter() - started)
+        return response
+
+    def observe(self, request, response, timing, elapsed):
+        view = request_url_name(request)
+        method = request.method if request.method in METHODS else "other"
+        REQUEST_LATENCY.labels(view=view, method=method).observe(elapsed)
+        REQUESTS.labels(view=view, method=method, status=str(response.status_code)).inc()
+        if timing.db_queries:
+            DB_QUERIES.labels(view=view).inc(timing.db_queries)
+            DB_QUERY_SECONDS.labels(view=view).inc(timing.db_time)
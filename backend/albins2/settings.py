@@ -52,10 +52,13 @@ INSTALLED_APPS = [
     'storages',
     'rest_framework',
     'api',
+    'auth.apps.AuthConfig',
     'django_cleanup',  # Should be places last
 ]
 
 MIDDLEWARE = [
+    'albins2.metrics.MetricsMiddleware',
+    'albins2.timing.RequestTimingMiddleware',  # Removes itself unless REQUEST_TIMING is set
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -85,22 +88,98 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'albins2.wsgi.application'
 
+# Serve the songbook and song read endpoints from async views. Set by the
+# uvicorn profile in gunicorn.conf.py; sync workers should leave it off.
+ASYNC_READ_VIEWS = os.getenv("ASYNC_READ_VIEWS", "false").lower() in {"1", "true", "yes", "on"}
+
+
+# Count requests, latency and queries per URL name for /api/metrics. Cheap
+# enough to leave on; gunicorn.conf.py makes the counts cover all workers.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in {"1", "true", "yes", "on"}
+
+# Add Server-Timing headers and a JSON timing log line to every response, see
+# albins2/timing.py. Costs a little per query, so it is off unless needed.
+REQUEST_TIMING = os.getenv("REQUEST_TIMING", "false").lower() in {"1", "true", "yes", "on"}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'albins2.timing': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# With DB_POOL_SIZE set, connections come from a bounded per-process pool
+# (albins2/db) and go back to it after every request; use this with the
+# uvicorn profile. Otherwise each thread keeps its connection for
+# DB_CONN_MAX_AGE seconds. Either way connections are health-checked before reuse.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 0))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'albins2.db' if DB_POOL_SIZE else 'django.db.backends.postgresql',
         'NAME': os.getenv("POSTGRES_DB", "albins"),
         'USER': os.getenv("POSTGRES_USER", "albins"),
         'PASSWORD': os.getenv("POSTGRES_PASSWORD", "albins"),
         'HOST': os.getenv("POSTGRES_HOST", "db"),
         'PORT': os.getenv("POSTGRES_PORT", 5432),
+        'CONN_MAX_AGE': 0 if DB_POOL_SIZE else int(os.getenv("DB_CONN_MAX_AGE", 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'connect_timeout': int(os.getenv("DB_CONNECT_TIMEOUT", 5)),
+        },
+        'POOL': {
+            'max_size': DB_POOL_SIZE,
+            'timeout': float(os.getenv("DB_POOL_TIMEOUT", 5)),
+            'check_after': float(os.getenv("DB_POOL_CHECK_AFTER", 30)),
+            'max_lifetime': float(os.getenv("DB_POOL_MAX_LIFETIME", 3600)),
+        },
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# The default LocMemCache is per process. Cached songbooks are checked against
+# the content version on every read, so workers and one-off commands never
+# serve each other's stale books; a shared backend (e.g. FileBasedCache on a
+# shared volume) only saves each worker from building its own copy.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv("DJANGO_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        'LOCATION': os.getenv("DJANGO_CACHE_LOCATION", "albins2"),
+    },
+    # Serialized songs and categories the songbook payload is assembled from
+    # (api/snapshot.py). One entry per song, so it gets its own entry limit.
+    'fragments': {
+        'BACKEND': os.getenv("DJANGO_FRAGMENT_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        'LOCATION': os.getenv("DJANGO_FRAGMENT_CACHE_LOCATION", "albins2-fragments"),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv("DJANGO_FRAGMENT_CACHE_MAX_ENTRIES", 20000)),
+        },
+    },
+}
+
+SONGBOOK_SNAPSHOT_TIMEOUT = int(os.getenv("SONGBOOK_SNAPSHOT_TIMEOUT", 60 * 60 * 24))
+
+# Slug of the book served at /api/songbook/ when several songbooks exist.
+DEFAULT_SONGBOOK = os.getenv("DEFAULT_SONGBOOK", "")
+
+# Let the songbook-export service (`export_songbooks --interval`) re-export
+# changed books to STATIC_ROOT/songbooks for nginx (see api/export.py),
+# keeping this many payload files per book for clients that are mid-download.
+SONGBOOK_STATIC_EXPORT = os.getenv("SONGBOOK_STATIC_EXPORT", "false").lower() in {"1", "true", "yes", "on"}
+SONGBOOK_EXPORT_KEEP = int(os.getenv("SONGBOOK_EXPORT_KEEP", 2))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -145,13 +224,33 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # REST Framework
 REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': ('knox.auth.TokenAuthentication',),
+    'DEFAULT_AUTHENTICATION_CLASSES': (
+        'auth.authentication.SignedTokenAuthentication',
+        'auth.authentication.CachedTokenAuthentication',
+    ),
+    # Views that set their own permission_classes must list TokenScopePermission
+    # too, or read-scoped anonymous tokens could write through them.
+    'DEFAULT_PERMISSION_CLASSES': (
+        'rest_framework.permissions.IsAuthenticated',
+        'auth.permissions.TokenScopePermission',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_THROTTLE_CLASSES': [
         'auth.throttling.TokenRateThrottle',
+        'auth.throttling.CachedReadRateThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'token': '600/hour',  # Limit requests per token
+        # Anonymous songbook reads, per client address and worker. Generous,
+        # since a whole party can share one address behind NAT.
+        'cached_read': '600/minute',
     },
+    # Requests arrive through the nginx in yxorp/, which appends the client
+    # address to X-Forwarded-For; per-address throttles read it from there.
+    'NUM_PROXIES': int(os.getenv("DJANGO_NUM_PROXIES", 1)),
 }
 
 
@@ -244,3 +343,11 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/api/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 TOKEN_EXPIRY = 7200
+
+# Validated knox tokens are remembered per process for this many seconds (0 disables).
+AUTH_TOKEN_CACHE_TTL = int(os.getenv("AUTH_TOKEN_CACHE_TTL", 60))
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", 1024))
+
+# Expired tokens are deleted by `manage.py purge_expired_tokens`; set this to
+# let knox also delete them while authenticating requests.
+TOKEN_CLEANUP_ON_REQUEST = os.getenv("TOKEN_CLEANUP_ON_REQUEST", "false").lower() in {"1", "true", "yes", "on"}
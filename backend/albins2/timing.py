@@ -0,0 +1,224 @@
+"""
+Per-request timing: SQL, authentication, view and render time.
+
+Enabled with the REQUEST_TIMING setting. Each response gets a
+``Server-Timing`` header and one JSON log line on the ``albins2.timing``
+logger, and the worker keeps running totals per URL name.
+"""
+
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+UNMATCHED_URL_NAME = "unmatched"
+PHASES = ("auth", "view", "render")
+
+_current = ContextVar("request_timing", default=None)
+_totals = {}
+_totals_lock = threading.Lock()
+
+
+class RequestTiming:
+    """Durations, in seconds, collected while one request is handled."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.view_started = None
+        self.render_started = None
+
+    def add(self, phase, seconds):
+        self.phases[phase] += seconds
+
+    def as_dict(self, total):
+        return {
+            "total_ms": round(total * 1000, 3),
+            "db_queries": self.db_queries,
+            "db_ms": round(self.db_time * 1000, 3),
+            **{f"{phase}_ms": round(seconds * 1000, 3) for phase, seconds in self.phases.items()},
+        }
+
+
+@contextmanager
+def measure(phase):
+    """
+    Add the time spent in the block to ``phase`` of the current request, if it is being timed.
+
+    Also works as a decorator, e.g. ``@measure("auth")`` on DRF authenticate().
+    """
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(phase, time.perf_counter() - started)
+
+
+def _record_query(execute, sql, params, many, context):
+    timing = _current.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.db_queries += 1
+        timing.db_time += time.perf_counter() - started
+
+
+def _install_query_recorder(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def enable_query_recording():
+    """Count the queries of timed requests on every connection of this process."""
+    # Connections opened later, including in sync_to_async threads, get the recorder on creation.
+    connection_created.connect(_install_query_recorder, dispatch_uid="albins2.timing")
+    for connection in connections.all(initialized_only=True):
+        _install_query_recorder(connection)
+
+
+@contextmanager
+def timed_request():
+    """Collect a RequestTiming for the enclosed request, sharing the one already running when nested."""
+    timing = _current.get()
+    if timing is not None:
+        yield timing
+        return
+    timing = RequestTiming()
+    token = _current.set(timing)
+    try:
+        yield timing
+    finally:
+        _current.reset(token)
+
+
+def request_url_name(request):
+    match = getattr(request, "resolver_match", None)
+    return (match and match.url_name) or UNMATCHED_URL_NAME
+
+
+def _record_totals(url_name, values):
+    with _totals_lock:
+        totals = _totals.setdefault(url_name, {"requests": 0})
+        totals["requests"] += 1
+        for name, value in values.items():
+            totals[name] = totals.get(name, 0) + value
+
+
+def timing_summary():
+    """Totals and per-request averages of every timed URL name in this worker."""
+    with _totals_lock:
+        snapshot = {url_name: dict(totals) for url_name, totals in _totals.items()}
+
+    summary = {}
+    for url_name, totals in sorted(snapshot.items()):
+        requests = totals.pop("requests")
+        summary[url_name] = {
+            "requests": requests,
+            "totals": {name: round(value, 3) for name, value in totals.items()},
+            "averages": {name: round(value / requests, 3) for name, value in totals.items()},
+        }
+    return summary
+
+
+def reset_timing_summary():
+    with _totals_lock:
+        _totals.clear()
+
+
+class RequestTimingMiddleware:
+    """
+    Time each request and report it as ``Server-Timing``, a log line and per-URL-name totals.
+
+    Put it first in MIDDLEWARE so ``total`` covers the whole stack. ``view``
+    runs from process_view until the view returns and includes ``auth`` and
+    the queries it makes; ``render`` is the time DRF spends rendering the
+    response afterwards. ``db`` counts every query made while handling the
+    request, on any thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_TIMING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+        enable_query_recording()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with timed_request() as timing:
+            response = self.get_response(request)
+        return self.finish(request, response, timing)
+
+    async def __acall__(self, request):
+        with timed_request() as timing:
+            response = await self.get_response(request)
+        return self.finish(request, response, timing)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timing = _current.get()
+        if timing is not None:
+            timing.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # Called after the view returns and before the response is rendered.
+        timing = _current.get()
+        if timing is not None and timing.view_started is not None:
+            timing.render_started = time.perf_counter()
+            timing.add("view", timing.render_started - timing.view_started)
+        return response
+
+    def finish(self, request, response, timing):
+        finished = time.perf_counter()
+        if timing.render_started is not None:
+            timing.add("render", finished - timing.render_started)
+        elif timing.view_started is not None:
+            timing.add("view", finished - timing.view_started)
+
+        name = request_url_name(request)
+        values = timing.as_dict(finished - timing.started)
+
+        response["Server-Timing"] = ", ".join(
+            [
+                f'db;dur={values["db_ms"]};desc="{values["db_queries"]} queries"',
+                *(f"{phase};dur={values[f'{phase}_ms']}" for phase in PHASES),
+                f"total;dur={values['total_ms']}",
+            ]
+        )
+        logger.info(
+            json.dumps(
+                {
+                    "event": "request_timing",
+                    "url_name": name,
+                    "method": request.method,
+                    "status": response.status_code,
+                    **values,
+                }
+            )
+        )
+        _record_totals(name, values)
+        return response
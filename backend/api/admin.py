@@ -2,6 +2,7 @@ from django.contrib import admin
 from admin_ordering.admin import OrderableAdmin
 
 from .models import Song, Category, SongBook
+from .search import filter_songs
 
 
 class SongFormInline(OrderableAdmin, admin.TabularInline):
@@ -38,6 +39,12 @@ class SongAdmin(admin.ModelAdmin):
     list_filter = ["category"]
     search_fields = ["title", "melody", "author", "content"]
 
+    def get_search_results(self, request, queryset, search_term):
+        # Use the full-text index instead of ILIKE scans over the HTML content.
+        if not search_term.strip():
+            return queryset, False
+        return filter_songs(queryset, search_term), False
+
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -52,3 +59,5 @@ class CategoryAdmin(admin.ModelAdmin):
 @admin.register(SongBook)
 class SongBookAdmin(admin.ModelAdmin):
     inlines = [CategoryFormInline]
+    list_display = ["name", "slug"]
+    prepopulated_fields = {"slug": ["name"]}
@@ -0,0 +1,308 @@
+"""
+Benchmarks for the API hot paths.
+
+Each run seeds synthetic books of the requested sizes, drives the endpoints
+through Django's test client (the full middleware, authentication and
+throttling stack, without a network) and records latency, throughput, peak
+memory allocated per request and SQL queries per request. The ``decode_*``
+scenarios compare the size of each book in every format clients can fetch
+and how long a client takes to decode it. Everything is written inside a
+transaction that is rolled back, so it can be pointed at a development
+database.
+"""
+
+import gzip
+import json
+import statistics
+import subprocess
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from auth.authentication import issue_anonymous_token
+
+from .importer import bulk_import_songs
+from .models import Song, SongBook
+from .renderers import MessagePackRenderer, msgpack
+from .snapshot import (
+    get_songbook_snapshot,
+    invalidate_songbook_directory,
+    invalidate_songbook_fragments,
+    invalidate_songbook_snapshot,
+)
+from .synthetic import generate_songbooks
+
+BENCHMARK_PREFIX = "Benchmark"
+CATEGORIES_PER_BOOK = 10
+# Django's GZipMiddleware and most proxies compress at about this level.
+GZIP_LEVEL = 6
+
+
+@dataclass(frozen=True)
+class QueryBudget:
+    """
+    Most SQL queries one request of a scenario may run.
+
+    With ``constant`` the count must also be the same for every book size,
+    which is what catches N+1 queries that small fixtures hide.
+    """
+
+    max_queries: int
+    constant: bool = True
+
+
+BUDGETS = {
+    # Content version, directory, book, categories, song versions and the songs whose
+    # cached fragments are missing. Anonymous songbook reads skip the throttle counter.
+    "songbook_cold": QueryBudget(6),
+    # Content version, book, categories and song versions: every fragment is cached.
+    "songbook_assemble": QueryBudget(4),
+    # The content version every cached book is checked against.
+    "songbook_warm": QueryBudget(1),
+    # The throttle counter and the rows.
+    "songs_list": QueryBudget(2),
+    "songs_retrieve": QueryBudget(2),
+    "anonymous_login": QueryBudget(0),
+    # Reads the existing rows once and writes in bulk (plus a slug lookup for a new book and
+    # a check for categories created concurrently); see BulkImportTests.
+    "importer": QueryBudget(20),
+}
+
+
+@dataclass
+class Result:
+    scenario: str
+    size: int
+    iterations: int
+    p50_ms: float
+    p95_ms: float
+    max_ms: float
+    throughput_rps: float
+    queries: int
+    peak_alloc_bytes: int
+    statuses: list = field(default_factory=list)
+    payload_bytes: int = None
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def _measure(scenario, size, iterations, run, before=None):
+    """
+    Call ``run()`` ``iterations`` times and summarize it; ``before()`` runs untimed ahead of each call.
+
+    ``run`` returns an HTTP status, or None for code that is not a request.
+    Allocations are measured on one extra call because tracing slows
+    everything else down.
+    """
+    latencies, queries, statuses = [], set(), set()
+    for _ in range(iterations):
+        if before:
+            before()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            status = run()
+            latencies.append(time.perf_counter() - started)
+        queries.add(len(captured.captured_queries))
+        if status is not None:
+            statuses.add(status)
+
+    if before:
+        before()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return Result(
+        scenario=scenario,
+        size=size,
+        iterations=iterations,
+        p50_ms=round(statistics.median(latencies) * 1000, 3),
+        p95_ms=round(_percentile(latencies, 0.95) * 1000, 3),
+        max_ms=round(max(latencies) * 1000, 3),
+        throughput_rps=round(iterations / sum(latencies), 1),
+        queries=max(queries),
+        peak_alloc_bytes=peak,
+        statuses=sorted(statuses),
+    )
+
+
+class _Reader:
+    """Test client authenticated like the app: a fresh anonymous token per request keeps throttling realistic."""
+
+    def __init__(self):
+        self.client = Client()
+
+    def get(self, url):
+        token, _ = issue_anonymous_token()
+        return self.client.get(url, HTTP_AUTHORIZATION=f"Token {token}").status_code
+
+
+def _encodings(payload):
+    """Yield ``(name, body, decode)`` for a songbook payload in JSON and MessagePack, plain and gzipped."""
+    yield "json", payload, json.loads
+    yield "json_gzip", gzip.compress(payload, GZIP_LEVEL), lambda body: json.loads(gzip.decompress(body))
+    if msgpack is None:
+        return
+    data = json.loads(payload)
+    for layout in MessagePackRenderer.layouts:
+        body = MessagePackRenderer().encode(data, layout)
+        yield f"msgpack_{layout}", body, msgpack.unpackb
+        yield (
+            f"msgpack_{layout}_gzip",
+            gzip.compress(body, GZIP_LEVEL),
+            lambda body: msgpack.unpackb(gzip.decompress(body)),
+        )
+
+
+def _decoder(decode, body):
+    def run():
+        decode(body)
+
+    return run
+
+
+def _import_entries(size):
+    return [
+        {
+            "title": f"Imported {index}",
+            "category": f"Imported {index % CATEGORIES_PER_BOOK}",
+            "text": f"Line {index}\nRefrain",
+            "page": index + 1,
+        }
+        for index in range(size)
+    ]
+
+
+def _run_book(size, iterations, seed):
+    prefix = f"{BENCHMARK_PREFIX} {size}"
+    generate_songbooks(
+        categories=CATEGORIES_PER_BOOK,
+        songs=max(size // CATEGORIES_PER_BOOK, 1),
+        seed=seed,
+        prefix=prefix,
+        replace=True,
+    )
+    songbook = SongBook.objects.get(name=f"{prefix} 1")
+    # generate_songbooks() drops cached books on commit, which never comes here.
+    invalidate_songbook_directory()
+    invalidate_songbook_snapshot(songbook.id)
+
+    reader = _Reader()
+    book_url = reverse("songbooks-detail", kwargs={"songbook": songbook.slug})
+    song = Song.objects.filter(category__songbook=songbook).order_by("order", "id")[size // 2]
+    song_url = reverse("songs-detail", kwargs={"pk": song.pk})
+    login_url = reverse("knox_anonymous_login")
+    client = Client()
+
+    def drop_book_and_fragments():
+        invalidate_songbook_snapshot(songbook.id)
+        invalidate_songbook_fragments(songbook.id)
+
+    yield _measure("songbook_cold", size, iterations, lambda: reader.get(book_url), before=drop_book_and_fragments)
+    yield _measure(
+        "songbook_assemble",
+        size,
+        iterations,
+        lambda: reader.get(book_url),
+        before=lambda: invalidate_songbook_snapshot(songbook.id),
+    )
+    reader.get(book_url)
+    yield _measure("songbook_warm", size, iterations, lambda: reader.get(book_url))
+    for name, body, decode in _encodings(get_songbook_snapshot(songbook.id)["payload"]):
+        result = _measure(f"decode_{name}", size, iterations, _decoder(decode, body))
+        result.payload_bytes = len(body)
+        yield result
+    yield _measure("songs_list", size, iterations, lambda: reader.get(reverse("songs-list")))
+    yield _measure("songs_retrieve", size, iterations, lambda: reader.get(song_url))
+    yield _measure("anonymous_login", size, iterations, lambda: client.post(login_url).status_code)
+
+    entries = _import_entries(size)
+
+    def import_and_undo():
+        with transaction.atomic():
+            bulk_import_songs(entries, songbook_name=f"{prefix} import")
+            transaction.set_rollback(True)
+
+    yield _measure("importer", size, max(iterations // 10, 1), import_and_undo)
+    invalidate_songbook_snapshot(songbook.id)
+
+
+def check_budgets(results, budgets=BUDGETS):
+    """Return a message for every scenario that ran more queries than its budget allows."""
+    failures = []
+    by_scenario = {}
+    for result in results:
+        by_scenario.setdefault(result.scenario, []).append(result)
+
+    for scenario, scenario_results in by_scenario.items():
+        budget = budgets.get(scenario)
+        if budget is None:
+            continue
+        counts = {result.size: result.queries for result in scenario_results}
+        for size, count in counts.items():
+            if count > budget.max_queries:
+                failures.append(f"{scenario}: {count} queries at size {size}, budget is {budget.max_queries}")
+        if budget.constant and len(set(counts.values())) > 1:
+            failures.append(f"{scenario}: query count grows with size {counts}")
+        for result in scenario_results:
+            if any(status >= 400 for status in result.statuses):
+                failures.append(f"{scenario}: HTTP {result.statuses} at size {result.size}")
+    return failures
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, cwd=settings.BASE_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes=(100, 1000, 10000), iterations=20, seed=0):
+    """
+    Benchmark every scenario once per book size and return the report as a dict.
+
+    The report holds the ``results``, any query-budget ``failures`` and the
+    commit it was taken at, so reports from different commits can be compared.
+    """
+    results = []
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]), transaction.atomic():
+        for size in sizes:
+            results.extend(_run_book(size, iterations, seed))
+        transaction.set_rollback(True)
+    # Books cached inside the rolled-back transaction carry content versions
+    # that will be handed out again; drop them.
+    invalidate_songbook_directory()
+
+    return {
+        "commit": _commit(),
+        "created": datetime.now(timezone.utc).isoformat(),
+        "database": connection.vendor,
+        "async_read_views": settings.ASYNC_READ_VIEWS,
+        "results": [asdict(result) for result in results],
+        "failures": check_budgets(results),
+    }
+
+
+def compare_reports(report, baseline):
+    """Yield ``(scenario, size, baseline p50, p50, ratio)`` for results present in both reports."""
+    previous = {(result["scenario"], result["size"]): result for result in baseline["results"]}
+    for result in report["results"]:
+        before = previous.get((result["scenario"], result["size"]))
+        if before and before["p50_ms"]:
+            ratio = result["p50_ms"] / before["p50_ms"]
+            yield result["scenario"], result["size"], before["p50_ms"], result["p50_ms"], ratio
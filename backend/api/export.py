@@ -0,0 +1,185 @@
+"""
+Static export of songbooks for nginx to serve without the API.
+
+Each book is written to ``STATIC_ROOT/songbooks/books/`` as a JSON file named
+after its content hash, with ``.gz`` and (when the brotli package is
+installed) ``.br`` siblings, so nginx can serve it precompressed and cache it
+forever. A small pointer document per book, ``books/<slug>.json``, names the
+current file, and ``songbooks/index.json`` lists every book's pointer and the
+default book. Readers fetch the pointer without caching and the book itself
+only when the hash changes.
+
+With SONGBOOK_STATIC_EXPORT on, ``export_songbooks --interval N`` keeps the
+files current: every N seconds it exports the books written since its last
+pass, so saves never wait for an export and a burst of edits costs one.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+
+from .models import Category, ContentVersion, Song, SongBook, Tombstone
+from .snapshot import build_songbook_snapshot, get_songbook_directory, resolve_songbook_id
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+EXPORT_DIR = "songbooks"
+HASH_LENGTH = 16
+# Brotli's best quality runs at about 1 MB/s; larger (synthetic) books use a faster level.
+BROTLI_BEST_QUALITY_LIMIT = 4 * 1024 * 1024
+
+
+def export_root():
+    return Path(settings.STATIC_ROOT) / EXPORT_DIR
+
+
+def _write_atomic(path, data):
+    """Replace ``path`` with ``data`` so nginx never serves a half-written file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=path.parent, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "wb") as stream:
+            stream.write(data)
+        os.chmod(temporary, 0o644)
+        os.replace(temporary, path)
+    except BaseException:
+        Path(temporary).unlink(missing_ok=True)
+        raise
+
+
+def _compressed_variants(payload):
+    # mtime=0 keeps the .gz file identical for identical content.
+    yield ".gz", gzip.compress(payload, compresslevel=9, mtime=0)
+    if brotli is not None:
+        quality = 11 if len(payload) <= BROTLI_BEST_QUALITY_LIMIT else 8
+        yield ".br", brotli.compress(payload, quality=quality)
+
+
+def _payload_files(books_dir, slug):
+    return [path for path in books_dir.glob(f"{slug}.*.json") if len(path.suffixes) == 2]
+
+
+def _prune(books_dir, slug, keep):
+    """Delete all but the ``keep`` newest payloads of a book, so clients mid-download still find theirs."""
+    payloads = sorted(_payload_files(books_dir, slug), key=lambda path: path.stat().st_mtime, reverse=True)
+    for path in payloads[keep:]:
+        for variant in (path, *(path.with_name(path.name + suffix) for suffix in (".gz", ".br"))):
+            variant.unlink(missing_ok=True)
+
+
+def export_songbook(songbook_id, keep=None):
+    """
+    Write one songbook's payload, its compressed siblings and its pointer; return the pointer.
+
+    Files that already exist for the same content are left alone, so an
+    unchanged book keeps its URL. Raises SongBook.DoesNotExist.
+    """
+    songbook = SongBook.objects.values("id", "name", "slug").get(pk=songbook_id)
+    payload = build_songbook_snapshot(songbook_id)
+    digest = hashlib.sha256(payload).hexdigest()[:HASH_LENGTH]
+
+    books_dir = export_root() / "books"
+    path = books_dir / f"{songbook['slug']}.{digest}.json"
+    if not path.exists():
+        for suffix, data in _compressed_variants(payload):
+            _write_atomic(path.with_name(path.name + suffix), data)
+        # The plain file goes last: its presence means the set is complete.
+        _write_atomic(path, payload)
+    else:
+        path.touch()
+
+    relative = path.relative_to(settings.STATIC_ROOT).as_posix()
+    pointer = {
+        **songbook,
+        "hash": digest,
+        "url": f"{settings.STATIC_URL}{relative}",
+        "size": len(payload),
+        "exported_at": datetime.now(timezone.utc).isoformat(),
+    }
+    _write_atomic(books_dir / f"{songbook['slug']}.json", json.dumps(pointer).encode())
+    _prune(books_dir, songbook["slug"], keep or settings.SONGBOOK_EXPORT_KEEP)
+    return pointer
+
+
+def write_export_index():
+    """
+    Write ``index.json`` from the books' pointers and drop the files of books that no longer exist.
+
+    Returns the index document.
+    """
+    books_dir = export_root() / "books"
+    directory = get_songbook_directory()
+    slugs = {entry["slug"] for entry in directory}
+
+    pointers = []
+    for entry in directory:
+        pointer_path = books_dir / f"{entry['slug']}.json"
+        if pointer_path.exists():
+            pointers.append(json.loads(pointer_path.read_bytes()))
+
+    if books_dir.exists():
+        for path in books_dir.glob("*.json"):
+            slug = path.name.split(".", 1)[0]
+            if slug not in slugs:
+                _prune(books_dir, slug, keep=0)
+                path.unlink(missing_ok=True)
+
+    try:
+        default = next(entry["slug"] for entry in directory if entry["id"] == resolve_songbook_id())
+    except (SongBook.DoesNotExist, SongBook.MultipleObjectsReturned, StopIteration):
+        default = None
+
+    index = {"default": default, "songbooks": pointers}
+    _write_atomic(export_root() / "index.json", json.dumps(index).encode())
+    return index
+
+
+def export_songbooks(songbook_ids=None):
+    """Export the given books (all books by default) and rewrite the index; return the pointers."""
+    if songbook_ids is None:
+        songbook_ids = [entry["id"] for entry in get_songbook_directory()]
+
+    pointers = []
+    for songbook_id in songbook_ids:
+        try:
+            pointers.append(export_songbook(songbook_id))
+        except SongBook.DoesNotExist:
+            pass
+    write_export_index()
+    return pointers
+
+
+def songbooks_changed_since(version):
+    """Ids of the books with rows, or deletions, newer than content version ``version``."""
+    querysets = [
+        SongBook.objects.filter(version__gt=version).values_list("id", flat=True),
+        Category.objects.filter(version__gt=version).values_list("songbook_id", flat=True),
+        Song.objects.filter(version__gt=version).values_list("category__songbook_id", flat=True),
+        Tombstone.objects.filter(version__gt=version).values_list("songbook_id", flat=True),
+    ]
+    return {songbook_id for queryset in querysets for songbook_id in queryset.order_by().distinct()}
+
+
+def export_changes(since=None):
+    """
+    Export the books written after content version ``since`` (all books when None).
+
+    Returns the content version to pass next time. It is read before looking
+    for changes, so a write that commits meanwhile is exported by the next
+    call, at worst a second time.
+    """
+    version = ContentVersion.current()
+    if since is None:
+        export_songbooks()
+    elif version != since:
+        export_songbooks(sorted(songbooks_changed_since(since)))
+    return version
@@ -0,0 +1,79 @@
+"""
+Read-only fast path producing the songbook serializers' output from ``.values()`` rows.
+
+The DRF serializers build model instances and walk a field object graph for
+every song. These functions read plain rows and build the same dicts, key for
+key and in the same order, for the songbook payload. Writes and every other
+endpoint still go through api/serializers.py; SongbookFragmentTests keeps the
+two byte-for-byte equivalent.
+"""
+
+from .models import Category, Song
+
+SONG_COLUMNS = (
+    "id",
+    "version",
+    "title",
+    "melody",
+    "author",
+    "content",
+    "audio",
+    "page_number",
+    "negative_page_number",
+    "order",
+    "line_count",
+    "stanza_count",
+    "category_id",
+)
+CATEGORY_COLUMNS = ("id", "name", "order", "version")
+
+
+def category_rows(songbook_id):
+    """Categories of a book as ``.values()`` dicts, in book order."""
+    return Category.objects.filter(songbook_id=songbook_id).order_by("order", "id").values(*CATEGORY_COLUMNS)
+
+
+def category_header(row):
+    """CategorySerializer's output for a category row, without its songs."""
+    return {"id": row["id"], "name": row["name"], "order": row["order"]}
+
+
+def song_representations(queryset, category_names):
+    """
+    Yield ``(song id, SongSerializer output)`` for the songs in ``queryset``.
+
+    ``category_names`` maps category id to name, standing in for the
+    ``category.name`` lookup SongSerializer makes per song.
+    """
+    audio_storage = Song._meta.get_field("audio").storage
+    for (
+        song_id,
+        version,
+        title,
+        melody,
+        author,
+        content,
+        audio,
+        page_number,
+        negative_page_number,
+        order,
+        line_count,
+        stanza_count,
+        category_id,
+    ) in queryset.values_list(*SONG_COLUMNS):
+        yield song_id, {
+            "id": song_id,
+            "category_name": category_names[category_id],
+            "version": version,
+            "title": title,
+            "melody": melody,
+            "author": author,
+            "content": content,
+            "audio": audio_storage.url(audio) if audio else None,
+            "page_number": page_number,
+            "negative_page_number": negative_page_number,
+            "order": order,
+            "line_count": line_count,
+            "stanza_count": stanza_count,
+            "category": category_id,
+        }
@@ -0,0 +1,274 @@
+"""Import songs from the legacy Albins JSON export."""
+
+import json
+import time
+from dataclasses import dataclass
+from functools import partial
+from itertools import chain, islice
+
+from django.db import transaction
+from django.db.models import Max
+
+from .models import LYRICS_FIELDS, ORDER_STEP, Category, ContentVersion, Song, SongBook
+from .snapshot import invalidate_songbook_snapshot
+
+READ_CHUNK_SIZE = 64 * 1024
+SONG_FIELDS = ["melody", "author", "content", "page_number", "negative_page_number"]
+
+
+def _parse_page(raw_value, sign):
+    if raw_value is None:
+        return None
+    try:
+        return sign * abs(int(raw_value))
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_entry(song_entry):
+    """Map one JSON entry onto Song field values, accepting the known key aliases."""
+    content = song_entry["text"].replace('\n', '</p><p>')
+
+    raw_page = (
+        song_entry.get("page_number")
+        or song_entry.get("page")
+        or song_entry.get("pageNumber")
+    )
+    raw_negative_page = (
+        song_entry.get("negative_page_number")
+        or song_entry.get("flipped_page_number")
+        or song_entry.get("flippedPageNumber")
+    )
+
+    return {
+        "title": song_entry["title"],
+        "category": song_entry["category"],
+        "melody": song_entry.get("melody", ""),
+        "author": "",
+        "content": f"<p>{content}</p>",
+        "page_number": _parse_page(raw_page, 1),
+        "negative_page_number": _parse_page(raw_negative_page, -1),
+    }
+
+
+def _iter_json_array(stream, buffer):
+    decoder = json.JSONDecoder()
+    buffer = buffer[1:]
+
+    while True:
+        buffer = buffer.lstrip().removeprefix(",").lstrip()
+        if buffer.startswith("]"):
+            return
+
+        try:
+            entry, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            # Either the next entry straddles the chunk boundary or the file is broken.
+            chunk = stream.read(READ_CHUNK_SIZE)
+            if not chunk:
+                raise
+            buffer += chunk
+            continue
+
+        yield entry
+        buffer = buffer[end:]
+
+
+def _iter_json_lines(stream, buffer):
+    for line in chain([buffer + stream.readline()], stream):
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_song_entries(stream):
+    """
+    Yield song entries one at a time from a JSON array or a JSON Lines stream.
+
+    Only the entry being decoded and one read chunk are held in memory, so
+    arbitrarily large archives can be imported.
+    """
+    buffer = ""
+    while not buffer:
+        chunk = stream.read(1)
+        if not chunk:
+            return
+        buffer = chunk.lstrip()
+
+    if buffer == "[":
+        yield from _iter_json_array(stream, buffer + stream.read(READ_CHUNK_SIZE))
+    else:
+        yield from _iter_json_lines(stream, buffer)
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+@dataclass
+class ImportStats:
+    categories_created: int = 0
+    categories_existing: int = 0
+    songs_created: int = 0
+    songs_updated: int = 0
+    songs_unchanged: int = 0
+    elapsed: float = 0.0
+
+    def __str__(self):
+        return (
+            f"{self.songs_created} songs created, {self.songs_updated} updated, "
+            f"{self.songs_unchanged} unchanged, {self.categories_created} categories created "
+            f"({self.categories_existing} already existed) in {self.elapsed:.2f}s"
+        )
+
+
+def import_songs(entries, songbook_name="Albins"):
+    """Row-by-row import, kept for small sources and as a reference implementation."""
+    songbook, _ = SongBook.objects.get_or_create(name=songbook_name)
+
+    for song_entry in entries:
+        values = normalize_entry(song_entry)
+        category, _ = Category.objects.get_or_create(name=values.pop("category"), songbook=songbook)
+        title = values.pop("title")
+        Song.objects.update_or_create(
+            title=title,
+            category=category,
+            defaults={**values, "category": category, "order": None},
+        )
+
+
+class BulkSongImporter:
+    """
+    Writes song entries batch by batch with a constant number of queries per batch.
+
+    Must be used inside a transaction; every row written by one importer shares
+    a single content version. Reserving it up front takes the content write
+    lock, so the orders computed in memory from the preloaded rows cannot clash
+    with concurrent admin saves.
+    """
+
+    def __init__(self, songbook):
+        self.songbook = songbook
+        self.stats = ImportStats()
+        self.version = ContentVersion.reserve()
+        self.categories = {category.name: category for category in Category.objects.filter(songbook=songbook)}
+        self.next_category_order = max(
+            (category.order or 0 for category in self.categories.values()), default=0
+        ) + ORDER_STEP
+        self.next_song_order = {
+            row["category_id"]: (row["max_order"] or 0) + ORDER_STEP
+            for row in Song.objects.filter(category__songbook=songbook)
+            .order_by()
+            .values("category_id")
+            .annotate(max_order=Max("order"))
+        }
+
+    def import_batch(self, entries):
+        # Later entries win, matching the row-by-row update_or_create behaviour.
+        pending = {}
+        for entry in entries:
+            values = normalize_entry(entry)
+            pending[(values["category"], values["title"])] = values
+
+        self._create_missing_categories({category_name for category_name, _ in pending})
+
+        existing = {
+            (song.category_id, song.title): song
+            for song in Song.objects.filter(
+                category__songbook=self.songbook,
+                title__in={title for _, title in pending},
+            ).order_by()
+        }
+
+        to_create, to_update = [], []
+        for (category_name, title), values in pending.items():
+            category = self.categories[category_name]
+            song = existing.get((category.id, title))
+            if song is None:
+                to_create.append(self._new_song(category, values))
+            elif any(getattr(song, field) != values[field] for field in SONG_FIELDS):
+                for field in SONG_FIELDS:
+                    setattr(song, field, values[field])
+                song.refresh_lyrics()
+                song.version = self.version
+                to_update.append(song)
+            else:
+                self.stats.songs_unchanged += 1
+
+        if to_create:
+            Song.objects.bulk_create(to_create)
+        if to_update:
+            Song.objects.bulk_update(to_update, [*SONG_FIELDS, *LYRICS_FIELDS, "version"])
+
+        self.stats.songs_created += len(to_create)
+        self.stats.songs_updated += len(to_update)
+
+    def _create_missing_categories(self, names):
+        missing = sorted(names - self.categories.keys())
+        if not missing:
+            return
+
+        new_categories = []
+        for name in missing:
+            new_categories.append(
+                Category(
+                    name=name,
+                    songbook=self.songbook,
+                    order=self.next_category_order,
+                    version=self.version,
+                )
+            )
+            self.next_category_order += ORDER_STEP
+
+        # A concurrent import may have created the same category; take it over.
+        # The upsert returns those rows too, so note which names already existed.
+        existing = set(
+            Category.objects.filter(songbook=self.songbook, name__in=missing).values_list("name", flat=True)
+        )
+        created = Category.objects.bulk_create(
+            new_categories,
+            update_conflicts=True,
+            unique_fields=["songbook", "name"],
+            update_fields=["version"],
+        )
+        for category in created:
+            self.categories[category.name] = category
+        self.stats.categories_created += len(created) - len(existing)
+        self.stats.categories_existing += len(existing)
+
+    def _new_song(self, category, values):
+        order = self.next_song_order.get(category.id, ORDER_STEP)
+        self.next_song_order[category.id] = order + ORDER_STEP
+        song = Song(
+            title=values["title"],
+            category=category,
+            order=order,
+            version=self.version,
+            **{field: values[field] for field in SONG_FIELDS},
+        )
+        song.refresh_lyrics()
+        return song
+
+
+def bulk_import_songs(entries, songbook_name="Albins", batch_size=None):
+    """
+    Import ``entries`` in one transaction using bulk writes.
+
+    With ``batch_size`` the entries are consumed lazily in chunks of that size,
+    otherwise they are written as a single batch.
+    """
+    started = time.perf_counter()
+
+    with transaction.atomic():
+        songbook, _ = SongBook.objects.get_or_create(name=songbook_name)
+        importer = BulkSongImporter(songbook)
+        batches = batched(entries, batch_size) if batch_size else [list(entries)]
+        for batch in batches:
+            importer.import_batch(batch)
+
+        # Bulk writes bypass the model signals that normally drop the snapshot.
+        transaction.on_commit(partial(invalidate_songbook_snapshot, songbook.id))
+
+    importer.stats.elapsed = time.perf_counter() - started
+    return importer.stats
@@ -0,0 +1,108 @@
+"""Plain-text lyrics derived from the CKEditor HTML stored in ``Song.content``."""
+
+import re
+from html.parser import HTMLParser
+
+BLOCK_TAGS = {"p", "div", "li", "blockquote", "pre", "h1", "h2", "h3", "h4", "h5", "h6"}
+WHITESPACE = re.compile(r"\s+")
+
+
+class _LyricsParser(HTMLParser):
+    """
+    Collects text lines from the editor HTML.
+
+    The importer writes one ``<p>`` per line with empty paragraphs between
+    stanzas, while songs typed into CKEditor tend to use ``<br>`` for lines and
+    one paragraph per stanza; both end up as lines separated by blank lines.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+        self._current = []
+        self._breaks_in_block = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "br":
+            self._end_line()
+            self._breaks_in_block = True
+        elif tag in BLOCK_TAGS:
+            self._end_line()
+            self._breaks_in_block = False
+
+    def handle_endtag(self, tag):
+        if tag not in BLOCK_TAGS:
+            return
+
+        had_text = self._end_line()
+        if not had_text or self._breaks_in_block:
+            self.lines.append("")
+        self._breaks_in_block = False
+
+    def handle_data(self, data):
+        self._current.append(data)
+
+    def _end_line(self):
+        line = WHITESPACE.sub(" ", "".join(self._current)).strip()
+        self._current = []
+        if line:
+            self.lines.append(line)
+        return bool(line)
+
+    def close(self):
+        super().close()
+        self._end_line()
+
+
+def extract_lyrics(html):
+    """Return ``(text, line_count, stanza_count)`` for the given editor HTML."""
+    parser = _LyricsParser()
+    parser.feed(html or "")
+    parser.close()
+
+    stanzas = []
+    current = []
+    for line in parser.lines:
+        if line:
+            current.append(line)
+        elif current:
+            stanzas.append(current)
+            current = []
+    if current:
+        stanzas.append(current)
+
+    text = "\n\n".join("\n".join(stanza) for stanza in stanzas)
+    return text, sum(len(stanza) for stanza in stanzas), len(stanzas)
+
+
+def backfill_lyrics(queryset, batch_size=500, version=None):
+    """
+    Recompute the derived lyric fields for every song in ``queryset``.
+
+    Only rows whose values change are written; they get ``version`` when one is
+    given. Returns the number of updated songs.
+    """
+    fields = ["lyrics", "line_count", "stanza_count"]
+    if version is not None:
+        fields.append("version")
+
+    updated = 0
+    pending = []
+    songs = queryset.only("id", "content", "lyrics", "line_count", "stanza_count").order_by("pk")
+    for song in songs.iterator(chunk_size=batch_size):
+        derived = extract_lyrics(song.content)
+        if derived == (song.lyrics, song.line_count, song.stanza_count):
+            continue
+
+        song.lyrics, song.line_count, song.stanza_count = derived
+        if version is not None:
+            song.version = version
+        pending.append(song)
+
+        if len(pending) >= batch_size:
+            updated += queryset.model.objects.bulk_update(pending, fields)
+            pending = []
+
+    if pending:
+        updated += queryset.model.objects.bulk_update(pending, fields)
+    return updated
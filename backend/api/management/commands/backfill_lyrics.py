@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.lyrics import backfill_lyrics
+from api.models import ContentVersion, Song
+from api.snapshot import invalidate_all_songbook_snapshots
+
+
+class Command(BaseCommand):
+    help = "Recompute the plain-text lyrics, line and stanza counts derived from each song's HTML content."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of songs read and written per batch (default: 500).",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            version = ContentVersion.reserve()
+            updated = backfill_lyrics(Song.objects.all(), batch_size=options["batch_size"], version=version)
+            # bulk_update bypasses the signals that normally drop the snapshot.
+            transaction.on_commit(invalidate_all_songbook_snapshots)
+
+        self.stdout.write(self.style.SUCCESS(f"Updated lyrics for {updated} songs."))
@@ -0,0 +1,48 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmark import compare_reports, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = "Benchmark the API hot paths against synthetic books and enforce SQL query budgets."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="100,1000,10000",
+            help="Comma-separated numbers of songs per benchmark book (default: 100,1000,10000).",
+        )
+        parser.add_argument("--iterations", type=int, default=20, help="Timed requests per scenario (default: 20).")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed for the synthetic books (default: 0).")
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+        parser.add_argument("--baseline", help="Earlier JSON report to compare median latencies against.")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options["sizes"].split(",")]
+        except ValueError:
+            raise CommandError("--sizes must be a comma-separated list of integers.")
+
+        report = run_benchmarks(sizes=sizes, iterations=options["iterations"], seed=options["seed"])
+
+        for result in report["results"]:
+            self.stdout.write(
+                f"{result['scenario']:<28} {result['size']:>7} songs  p50 {result['p50_ms']:>9.2f} ms  "
+                f"p95 {result['p95_ms']:>9.2f} ms  {result['throughput_rps']:>8.1f} req/s  "
+                f"{result['queries']:>2} queries  {result['peak_alloc_bytes'] / 1024:>9.0f} KiB peak"
+                + (f"  {result['payload_bytes'] / 1024:>9.0f} KiB payload" if result["payload_bytes"] else "")
+            )
+        if options["baseline"]:
+            with open(options["baseline"]) as stream:
+                baseline = json.load(stream)
+            for scenario, size, before, after, ratio in compare_reports(report, baseline):
+                self.stdout.write(f"{scenario:<28} {size:>7} songs  p50 {before:.2f} -> {after:.2f} ms ({ratio:.2f}x)")
+        if options["output"]:
+            with open(options["output"], "w") as stream:
+                json.dump(report, stream, indent=2)
+
+        if report["failures"]:
+            raise CommandError("Query budget exceeded:\n" + "\n".join(report["failures"]))
+        self.stdout.write(self.style.SUCCESS("All query budgets met."))
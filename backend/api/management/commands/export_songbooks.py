@@ -0,0 +1,50 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.export import export_changes, export_songbooks
+from api.models import SongBook
+from api.snapshot import resolve_songbook_id
+
+
+class Command(BaseCommand):
+    help = "Write songbooks to STATIC_ROOT as content-hashed, precompressed JSON for nginx to serve."
+
+    def add_arguments(self, parser):
+        parser.add_argument("songbooks", nargs="*", help="Slugs or ids of the books to export (default: all).")
+        parser.add_argument(
+            "--interval",
+            type=int,
+            help=(
+                "Keep running: export all books, then every INTERVAL seconds the books changed since. "
+                "Exits right away unless SONGBOOK_STATIC_EXPORT is on."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if options["interval"]:
+            return self.watch(options["interval"])
+
+        songbook_ids = None
+        if options["songbooks"]:
+            try:
+                songbook_ids = [resolve_songbook_id(key) for key in options["songbooks"]]
+            except SongBook.DoesNotExist:
+                raise CommandError("Songbook not found.")
+
+        for pointer in export_songbooks(songbook_ids):
+            self.stdout.write(f"{pointer['slug']}: {pointer['url']} ({pointer['size']} bytes)")
+        self.stdout.write(self.style.SUCCESS("Export complete."))
+
+    def watch(self, interval):
+        if not settings.SONGBOOK_STATIC_EXPORT:
+            self.stdout.write("SONGBOOK_STATIC_EXPORT is off; nothing to do.")
+            return
+
+        version = None
+        while True:
+            previous, version = version, export_changes(version)
+            if version != previous:
+                self.stdout.write(self.style.SUCCESS(f"Exported changes up to version {version}."))
+            time.sleep(interval)
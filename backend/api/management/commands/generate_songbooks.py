@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import SongBook
+from api.synthetic import generate_songbooks
+
+
+class Command(BaseCommand):
+    help = "Generate deterministic synthetic songbooks for load and scale testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=1, help="Number of songbooks (default: 1).")
+        parser.add_argument("--categories", type=int, default=10, help="Categories per songbook (default: 10).")
+        parser.add_argument("--songs", type=int, default=100, help="Songs per category (default: 100).")
+        parser.add_argument(
+            "--lyric-lines",
+            type=int,
+            default=16,
+            help="Average number of lyric lines per song (default: 16).",
+        )
+        parser.add_argument("--stanza-lines", type=int, default=4, help="Lines per stanza (default: 4).")
+        parser.add_argument(
+            "--audio-ratio",
+            type=float,
+            default=0.0,
+            help="Share of songs that reference an audio file, 0-1 (default: 0).",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0).")
+        parser.add_argument("--prefix", default="Synthetic", help="Songbook name prefix (default: Synthetic).")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="Number of song rows written per COPY (default: 10000).",
+        )
+        parser.add_argument(
+            "--replace",
+            action="store_true",
+            help="Delete existing songbooks with the generated names first.",
+        )
+
+    def handle(self, *args, **options):
+        names = [f"{options['prefix']} {number}" for number in range(1, options["books"] + 1)]
+        existing = SongBook.objects.filter(name__in=names).values_list("name", flat=True)
+        if existing and not options["replace"]:
+            raise CommandError(f"Songbooks already exist: {', '.join(existing)}. Use --replace to regenerate them.")
+
+        stats = generate_songbooks(
+            books=options["books"],
+            categories=options["categories"],
+            songs=options["songs"],
+            lyric_lines=options["lyric_lines"],
+            stanza_lines=options["stanza_lines"],
+            audio_ratio=options["audio_ratio"],
+            seed=options["seed"],
+            prefix=options["prefix"],
+            batch_size=options["batch_size"],
+            replace=options["replace"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Generated {stats}."))
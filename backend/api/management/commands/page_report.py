@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from api.models import SongBook
+from api.pages import find_page_collisions
+
+
+class Command(BaseCommand):
+    help = "List pages that hold more than one song, per songbook."
+
+    def handle(self, *args, **options):
+        found = False
+        for songbook in SongBook.objects.order_by("name"):
+            for page, titles in find_page_collisions(songbook):
+                found = True
+                self.stdout.write(f"{songbook.name}: page {page} is shared by {', '.join(titles)}")
+
+        if not found:
+            self.stdout.write(self.style.SUCCESS("No page collisions found."))
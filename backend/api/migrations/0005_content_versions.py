@@ -0,0 +1,48 @@
+# Generated by Django 5.0 on 2026-10-18 14:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_song_negative_page_number_alter_song_page_number'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('songbook', 'Songbook'), ('category', 'Category'), ('song', 'Song')], max_length=16)),
+                ('object_id', models.BigIntegerField()),
+                ('songbook_id', models.BigIntegerField(db_index=True)),
+                ('version', models.BigIntegerField(db_index=True)),
+            ],
+            options={
+                'ordering': ['version', 'id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='version',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='song',
+            name='version',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='songbook',
+            name='version',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+    ]
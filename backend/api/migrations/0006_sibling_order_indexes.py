@@ -0,0 +1,21 @@
+# Generated by Django 5.0 on 2026-10-18 14:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_content_versions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['songbook', 'order'], name='api_categor_songboo_5fe098_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='song',
+            index=models.Index(fields=['category', 'order'], name='api_song_categor_0a72ba_idx'),
+        ),
+    ]
@@ -0,0 +1,132 @@
+# Generated by Django 5.0 on 2026-10-18 14:09
+
+import re
+from html.parser import HTMLParser
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+# A frozen copy of api.lyrics as it was when this migration was written, so
+# later changes to the live extraction do not change what this migration does.
+BLOCK_TAGS = {'p', 'div', 'li', 'blockquote', 'pre', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+WHITESPACE = re.compile(r'\s+')
+
+
+class LyricsParser(HTMLParser):
+
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+        self._current = []
+        self._breaks_in_block = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'br':
+            self._end_line()
+            self._breaks_in_block = True
+        elif tag in BLOCK_TAGS:
+            self._end_line()
+            self._breaks_in_block = False
+
+    def handle_endtag(self, tag):
+        if tag not in BLOCK_TAGS:
+            return
+
+        had_text = self._end_line()
+        if not had_text or self._breaks_in_block:
+            self.lines.append('')
+        self._breaks_in_block = False
+
+    def handle_data(self, data):
+        self._current.append(data)
+
+    def _end_line(self):
+        line = WHITESPACE.sub(' ', ''.join(self._current)).strip()
+        self._current = []
+        if line:
+            self.lines.append(line)
+        return bool(line)
+
+    def close(self):
+        super().close()
+        self._end_line()
+
+
+def extract_lyrics(html):
+    parser = LyricsParser()
+    parser.feed(html or '')
+    parser.close()
+
+    stanzas = []
+    current = []
+    for line in parser.lines:
+        if line:
+            current.append(line)
+        elif current:
+            stanzas.append(current)
+            current = []
+    if current:
+        stanzas.append(current)
+
+    text = '\n\n'.join('\n'.join(stanza) for stanza in stanzas)
+    return text, sum(len(stanza) for stanza in stanzas), len(stanzas)
+
+
+def populate_lyrics(apps, schema_editor):
+    Song = apps.get_model('api', 'Song')
+    fields = ['lyrics', 'line_count', 'stanza_count']
+    pending = []
+    for song in Song.objects.only('id', 'content').order_by('pk').iterator(chunk_size=500):
+        song.lyrics, song.line_count, song.stanza_count = extract_lyrics(song.content)
+        if song.lyrics:
+            pending.append(song)
+        if len(pending) >= 500:
+            Song.objects.bulk_update(pending, fields)
+            pending = []
+    if pending:
+        Song.objects.bulk_update(pending, fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_song_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='song',
+            name='line_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='song',
+            name='lyrics',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='song',
+            name='stanza_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_lyrics, migrations.RunPython.noop),
+        # Generated columns cannot be altered in place; drop and re-add it.
+        migrations.RemoveIndex(
+            model_name='song',
+            name='api_song_search__ebd0f1_gin',
+        ),
+        migrations.RemoveField(
+            model_name='song',
+            name='search_vector',
+        ),
+        migrations.AddField(
+            model_name='song',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('title', config='simple', weight='A'), '||', django.contrib.postgres.search.SearchVector('melody', 'author', config='simple', weight='B'), django.contrib.postgres.search.SearchConfig('simple')), '||', django.contrib.postgres.search.SearchVector('lyrics', config='simple', weight='C'), django.contrib.postgres.search.SearchConfig('simple')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddIndex(
+            model_name='song',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='api_song_search__ebd0f1_gin'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0 on 2026-10-18 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_song_lyrics'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='song',
+            name='negative_page_number',
+            field=models.IntegerField(blank=True, db_index=True, null=True, verbose_name='Negative page number'),
+        ),
+        migrations.AlterField(
+            model_name='song',
+            name='page_number',
+            field=models.IntegerField(blank=True, db_index=True, null=True, verbose_name='Page number'),
+        ),
+    ]
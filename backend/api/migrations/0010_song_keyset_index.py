@@ -0,0 +1,17 @@
+# Generated by Django 5.0 on 2026-10-18 14:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_song_page_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='song',
+            index=models.Index(fields=['order', 'id'], name='api_song_order_c93c0c_idx'),
+        ),
+    ]
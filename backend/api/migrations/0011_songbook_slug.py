@@ -0,0 +1,46 @@
+# Generated by Django 5.0 on 2026-10-18 14:14
+
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+# A frozen copy of api.models.unique_slug as it was when this migration was
+# written, so books slugged here get the slug the model would have given them.
+def unique_slug(name, taken, fallback='songbook', max_length=255):
+    slug = base = slugify(name) or fallback
+    suffix = 2
+    while slug in taken:
+        ending = f'-{suffix}'
+        slug = base[: max_length - len(ending)] + ending
+        suffix += 1
+    return slug
+
+
+def populate_slugs(apps, schema_editor):
+    SongBook = apps.get_model('api', 'SongBook')
+    taken = set()
+    for songbook in SongBook.objects.order_by('pk'):
+        songbook.slug = unique_slug(songbook.name, taken)
+        taken.add(songbook.slug)
+        songbook.save(update_fields=['slug'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_song_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='songbook',
+            name='slug',
+            field=models.SlugField(blank=True, db_index=False, max_length=255, null=True),
+        ),
+        migrations.RunPython(populate_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='songbook',
+            name='slug',
+            field=models.SlugField(blank=True, max_length=255, unique=True),
+        ),
+    ]
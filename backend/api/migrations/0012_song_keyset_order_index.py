@@ -0,0 +1,22 @@
+# Generated by Django 5.0 on 2026-10-18 15:37
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_songbook_slug'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='song',
+            name='api_song_order_c93c0c_idx',
+        ),
+        migrations.AddIndex(
+            model_name='song',
+            index=models.Index(django.db.models.functions.comparison.Coalesce('order', models.Value(2147483647), output_field=models.PositiveIntegerField()), models.F('id'), name='api_song_keyset_idx'),
+        ),
+    ]
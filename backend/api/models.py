@@ -1,15 +1,179 @@
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import connection, models, transaction
+from django.db.models import F, Max, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils.text import slugify
 from django_ckeditor_5.fields import CKEditor5Field
 
+from .lyrics import extract_lyrics
 
-class SongBook(models.Model):
+ORDER_STEP = 10
+# Orders are optional. Keyset pages put rows without one last, as PostgreSQL
+# sorts NULLs, by standing in the largest order a PositiveIntegerField can hold.
+UNORDERED = 2147483647
+LYRICS_FIELDS = ["lyrics", "line_count", "stanza_count"]
+
+# Songs mix Swedish, Finnish and English, so search uses the language-neutral
+# configuration without stemming.
+SEARCH_CONFIG = "simple"
+
+
+class ContentVersion(models.Model):
+    """Single-row counter handing out monotonic change versions."""
+
+    value = models.BigIntegerField(default=0)
+
+    @classmethod
+    def reserve(cls, count=1):
+        """
+        Reserve ``count`` consecutive versions and return the highest one.
+
+        The upsert locks the counter row until the surrounding transaction
+        commits, so versions become visible to readers in increasing order.
+        """
+        table = connection.ops.quote_name(cls._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (id, value) VALUES (1, %s) "
+                f"ON CONFLICT (id) DO UPDATE SET value = {table}.value + EXCLUDED.value "
+                "RETURNING value",
+                [count],
+            )
+            return cursor.fetchone()[0]
+
+    @classmethod
+    def current(cls):
+        return cls.objects.filter(pk=1).values_list("value", flat=True).first() or 0
+
+    @classmethod
+    async def acurrent(cls):
+        return await cls.objects.filter(pk=1).values_list("value", flat=True).afirst() or 0
+
+
+def keyset_order():
+    """The ``order`` column with NULL replaced by UNORDERED, for comparisons that must see every row."""
+    return Coalesce("order", Value(UNORDERED), output_field=models.PositiveIntegerField())
+
+
+class VersionedModel(models.Model):
+    version = models.BigIntegerField(default=0, editable=False, db_index=True)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if not update_fields:
+                # An empty update_fields saves nothing, so there is no change to version.
+                return
+            kwargs["update_fields"] = {*update_fields, "version"}
+
+        with transaction.atomic():
+            # The counter row stays locked until commit, which serialises all
+            # content writes; anything computed by the write itself is race-free.
+            self.version = ContentVersion.reserve()
+            super().save(*args, **kwargs)
+
+
+class OrderedModel(VersionedModel):
+    """
+    Appends new rows after their siblings.
+
+    The next order is computed by the INSERT itself and returned alongside the
+    primary key, so no extra query is needed and, thanks to the version lock,
+    concurrent writers cannot pick the same value.
+    """
+
+    # Attribute name of the foreign key whose rows share one order sequence.
+    order_scope = None
+
+    class Meta:
+        abstract = True
+
+    def _next_order(self):
+        siblings = (
+            type(self)._base_manager.filter(**{self.order_scope: getattr(self, self.order_scope)})
+            .order_by()
+            .values(self.order_scope)
+            .annotate(highest=Max("order"))
+            .values("highest")
+        )
+        return Coalesce(Subquery(siblings), 0, output_field=models.PositiveIntegerField()) + ORDER_STEP
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        writes_order = update_fields is None or "order" in update_fields
+        if writes_order and self.order is None and getattr(self, self.order_scope) is not None:
+            self.order = self._next_order()
+
+        super().save(*args, **kwargs)
+
+        if hasattr(self.order, "resolve_expression"):
+            # Only inserts hand the computed value back; updates need a re-read.
+            self.refresh_from_db(fields=["order"])
+
+    def _do_insert(self, manager, using, fields, returning_fields, raw):
+        if not hasattr(self.order, "resolve_expression"):
+            return super()._do_insert(manager, using, fields, returning_fields, raw)
+
+        order_field = self._meta.get_field("order")
+        rows = super()._do_insert(manager, using, fields, [*returning_fields, order_field], raw)
+        self.order = rows[0][-1]
+        return [row[:-1] for row in rows]
+
+
+class Tombstone(models.Model):
+    """Records a deleted songbook, category or song for delta-syncing clients."""
+
+    SONGBOOK = "songbook"
+    CATEGORY = "category"
+    SONG = "song"
+    KIND_CHOICES = [(SONGBOOK, "Songbook"), (CATEGORY, "Category"), (SONG, "Song")]
+
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    # Plain id rather than a foreign key so tombstones outlive their songbook.
+    songbook_id = models.BigIntegerField(db_index=True)
+    version = models.BigIntegerField(db_index=True)
+
+    class Meta:
+        ordering = ["version", "id"]
+
+
+def unique_slug(name, taken, fallback="songbook", max_length=255):
+    """
+    Slugify ``name``, or use ``fallback`` when nothing is left of it, and add
+    ``-2``, ``-3``, ... until the slug is not in ``taken``.
+    """
+    slug = base = slugify(name) or fallback
+    suffix = 2
+    while slug in taken:
+        ending = f"-{suffix}"
+        slug = base[: max_length - len(ending)] + ending
+        suffix += 1
+    return slug
+
+
+class SongBook(VersionedModel):
     name = models.CharField(max_length=255, verbose_name="Name", unique=True)
+    slug = models.SlugField(max_length=255, unique=True, blank=True)
+
+    def save(self, *args, **kwargs):
+        if not self.slug:
+            # "Sång" and "Sang" share a base slug; only those can collide.
+            base = slugify(self.name) or "songbook"
+            taken = SongBook.objects.filter(slug__startswith=base).exclude(pk=self.pk).values_list("slug", flat=True)
+            self.slug = unique_slug(self.name, set(taken))
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
 
 
-class Category(models.Model):
+class Category(OrderedModel):
     name = models.CharField(max_length=255, verbose_name="Name")
     order = models.PositiveIntegerField(blank=True, null=True)
     songbook = models.ForeignKey(SongBook, on_delete=models.CASCADE, related_name="categories")
@@ -21,36 +185,50 @@ class Category(models.Model):
         constraints = [
             models.UniqueConstraint(fields=["songbook", "name"], name="unique_category_per_book"),
         ]
+        indexes = [models.Index(fields=["songbook", "order"])]
 
-    def save(self, *args, **kwargs):
-        if self.order is None and self.songbook_id:
-            last_order = (
-                Category.objects.filter(songbook=self.songbook)
-                .order_by("-order")
-                .first()
-            )
-            base_order = last_order.order if last_order and last_order.order is not None else 0
-            self.order = base_order + 10
-        super().save(*args, **kwargs)
+    order_scope = "songbook_id"
 
     def __str__(self):
         return f"{self.name} ({self.songbook.name})"
 
-class Song(models.Model):
+class Song(OrderedModel):
     title = models.CharField(max_length=255, verbose_name="Title")
     melody = models.CharField(max_length=255, blank=True, null=True, verbose_name="Melody")
     author = models.CharField(max_length=255, blank=True, null=True, verbose_name="Author")
     content = CKEditor5Field(blank=True, null=True, verbose_name="Content")
     audio = models.FileField(upload_to="songs/audio/", blank=True, null=True, verbose_name="Audio")
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="songs")
-    page_number = models.IntegerField(blank=True, null=True, verbose_name="Page number")
-    negative_page_number = models.IntegerField(blank=True, null=True, verbose_name="Negative page number")
+    page_number = models.IntegerField(blank=True, null=True, db_index=True, verbose_name="Page number")
+    negative_page_number = models.IntegerField(
+        blank=True, null=True, db_index=True, verbose_name="Negative page number"
+    )
     order = models.PositiveIntegerField(blank=True, null=True)
+    # Derived from ``content`` on save; see refresh_lyrics().
+    lyrics = models.TextField(blank=True, default="", editable=False)
+    line_count = models.PositiveIntegerField(default=0, editable=False)
+    stanza_count = models.PositiveIntegerField(default=0, editable=False)
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector("title", weight="A", config=SEARCH_CONFIG)
+            + SearchVector("melody", "author", weight="B", config=SEARCH_CONFIG)
+            + SearchVector("lyrics", weight="C", config=SEARCH_CONFIG)
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
 
     class Meta:
         verbose_name = "Song"
         verbose_name_plural = "Songs"
         ordering = ["order", "id"]
+        indexes = [
+            models.Index(fields=["category", "order"]),
+            models.Index(keyset_order(), F("id"), name="api_song_keyset_idx"),
+            GinIndex(fields=["search_vector"]),
+        ]
+
+    order_scope = "category_id"
 
     def save(self, *args, **kwargs):
         if self.page_number is not None:
@@ -59,10 +237,17 @@ class Song(models.Model):
         if self.negative_page_number is not None:
             self.negative_page_number = -abs(self.negative_page_number)
 
-        if self.order is None:
-            last_order = Song.objects.filter(category=self.category).order_by("-order").first()
-            self.order = (last_order.order + 10) if last_order else 10
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "content" in update_fields:
+            self.refresh_lyrics()
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, *LYRICS_FIELDS}
+
         super().save(*args, **kwargs)
 
+    def refresh_lyrics(self):
+        """Recompute the plain-text lyrics and counts from ``content``."""
+        self.lyrics, self.line_count, self.stanza_count = extract_lyrics(self.content)
+
     def __str__(self):
         return f"{self.title} ({self.category.name})"
@@ -0,0 +1,49 @@
+"""Lookups by printed page number in the physical songbook."""
+
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db.models import Count
+
+from .models import Song
+
+PAGE_RESULT_LIMIT = 200
+
+
+def page_field(page):
+    """Positive pages count from the front of the book, negative ones from the flipped back."""
+    return "page_number" if page > 0 else "negative_page_number"
+
+
+def songs_on_page(queryset, page):
+    if page == 0:
+        return queryset.none()
+    return queryset.filter(**{page_field(page): page})
+
+
+def songs_in_page_range(queryset, start, end):
+    """Songs printed on pages ``start``..``end`` (inclusive, both on the same side of the book)."""
+    if start == 0 or end == 0 or (start > 0) != (end > 0):
+        return queryset.none()
+
+    field = page_field(start)
+    low, high = sorted((start, end))
+    return queryset.filter(**{f"{field}__range": (low, high)}).order_by(field, "order", "id")
+
+
+def find_page_collisions(songbook):
+    """
+    Report pages that hold more than one song in ``songbook``.
+
+    Returns a list of ``(page, [titles])`` tuples ordered by page, covering both
+    the front and the flipped side of the book.
+    """
+    songs = Song.objects.filter(category__songbook=songbook).order_by()
+    collisions = []
+    for field in ("page_number", "negative_page_number"):
+        collisions.extend(
+            songs.filter(**{f"{field}__isnull": False})
+            .values(field)
+            .annotate(count=Count("id"), titles=ArrayAgg("title", ordering="title"))
+            .filter(count__gt=1)
+            .values_list(field, "titles")
+        )
+    return sorted(collisions, key=lambda collision: (collision[0] < 0, abs(collision[0])))
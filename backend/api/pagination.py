@@ -0,0 +1,88 @@
+import base64
+import binascii
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .models import keyset_order
+
+
+class OrderKeysetPagination(BasePagination):
+    """
+    Keyset pagination over ``(order, id)``.
+
+    Each page is a single indexed range scan continuing after the last row of
+    the previous page, so deep pages cost the same as the first one. Rows
+    without an order come last; see keyset_order().
+    """
+
+    page_size = 100
+    max_page_size = 500
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.get_page(list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return self.get_page([row async for row in self.page_queryset(queryset, request)])
+
+    def page_queryset(self, queryset, request):
+        """Return the rows of the requested page plus one to tell whether another page follows."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.annotate(keyset_order=keyset_order()).order_by("keyset_order", "id")
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            order, pk = cursor
+            queryset = queryset.filter(Q(keyset_order__gt=order) | Q(keyset_order=order, id__gt=pk))
+        return queryset[: self.page_size + 1]
+
+    def get_page(self, rows):
+        page = rows[: self.page_size]
+        self.next_cursor = self.encode_cursor(page[-1]) if len(rows) > self.page_size else None
+        return page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            order, pk = base64.urlsafe_b64decode(encoded.encode("ascii")).decode("ascii").split(":")
+            return int(order), int(pk)
+        except (binascii.Error, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, row):
+        return base64.urlsafe_b64encode(f"{row.keyset_order}:{row.pk}".encode("ascii")).decode("ascii")
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
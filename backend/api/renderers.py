@@ -0,0 +1,127 @@
+"""
+Response renderers: JSON through orjson, with the same output as DRF's
+JSONRenderer, and MessagePack for clients on slow connections.
+
+Both encoders are optional packages. Without orjson JSON is rendered by
+JSONRenderer; without msgpack the MessagePack format is not offered.
+"""
+
+from django.utils.http import parse_header_parameters
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack is optional
+    msgpack = None
+
+_encoder = JSONEncoder()
+
+
+def _dumps(data):
+    # Types orjson does not know, and datetimes, which DRF formats its own way,
+    # go through DRF's encoder.
+    rendered = orjson.dumps(
+        data,
+        default=_encoder.default,
+        option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+    )
+    # Like JSONRenderer, escape the two line separators that are valid JSON but not valid JavaScript.
+    return rendered.replace("\u2028".encode(), b"\\u2028").replace("\u2029".encode(), b"\\u2029")
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson when it can.
+
+    With DRF's default compact, unicode and strict settings the bytes match
+    JSONRenderer, except for floats Python writes with an exponent (``1e-05``
+    becomes ``1e-5``). Indented output, other settings and anything orjson
+    rejects fall back to JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            return _dumps(data)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+def render_json(data):
+    return FastJSONRenderer().render(data)
+
+
+# Lists of records that the columnar layout stores as one key list and rows of values;
+# None stands for a response that is itself such a list.
+COLUMNAR_KEYS = {None, "songs", "results"}
+
+
+def _columns(records):
+    columns = list(dict.fromkeys(key for record in records for key in record))
+    return {"columns": columns, "rows": [[record.get(key) for key in columns] for record in records]}
+
+
+def to_columns(data, key=None):
+    """
+    Return ``data`` with its song lists turned into ``{"columns": [...], "rows": [[...], ...]}``.
+
+    Keys are then written once per list instead of once per song. A song
+    without one of the columns gets None in its row.
+    """
+    if isinstance(data, dict):
+        return {name: to_columns(value, name) for name, value in data.items()}
+    if isinstance(data, list):
+        items = [to_columns(item) for item in data]
+        if key in COLUMNAR_KEYS and all(isinstance(item, dict) for item in items):
+            return _columns(items)
+        return items
+    return data
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    MessagePack for ``Accept: application/msgpack`` (or ``?format=msgpack``).
+
+    Song lists use the columnar layout of to_columns() unless the client asks
+    for ``application/msgpack; layout=rows``, which keeps the JSON shape.
+    """
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+    layouts = ("columns", "rows")
+
+    def get_layout(self, accepted_media_type):
+        if accepted_media_type:
+            _, params = parse_header_parameters(accepted_media_type)
+            if params.get("layout") in self.layouts:
+                return params["layout"]
+        return self.layouts[0]
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return self.encode(data, self.get_layout(accepted_media_type))
+
+    def encode(self, data, layout):
+        if layout == "columns":
+            data = to_columns(data)
+        return msgpack.packb(data, default=_encoder.default, use_bin_type=True)
+
+
+# Extra renderers for the endpoints that offer MessagePack, when msgpack is installed.
+MSGPACK_RENDERER_CLASSES = [MessagePackRenderer] if msgpack is not None else []
@@ -0,0 +1,53 @@
+import re
+
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db.models import F
+
+from .models import SEARCH_CONFIG, Song
+
+SEARCH_RESULT_LIMIT = 50
+TERM_PATTERN = re.compile(r"\w+")
+
+
+def build_search_query(terms):
+    """
+    Turn free text into a prefix-matching tsquery, so "hel gå" finds "Helan går".
+
+    Returns None when the text contains nothing searchable.
+    """
+    words = TERM_PATTERN.findall(terms)
+    if not words:
+        return None
+    return SearchQuery(" & ".join(f"{word}:*" for word in words), search_type="raw", config=SEARCH_CONFIG)
+
+
+def filter_songs(queryset, terms):
+    """Restrict ``queryset`` to songs matching ``terms`` through the GIN-indexed vector."""
+    query = build_search_query(terms)
+    if query is None:
+        return queryset.none()
+    return queryset.filter(search_vector=query)
+
+
+def search_songs(terms, queryset=None):
+    """Return matching songs ranked title > melody/author > lyrics, with a highlighted lyric snippet."""
+    query = build_search_query(terms)
+    queryset = Song.objects.select_related("category") if queryset is None else queryset
+    if query is None:
+        return queryset.none()
+
+    return (
+        queryset.filter(search_vector=query)
+        .annotate(
+            rank=SearchRank(F("search_vector"), query),
+            snippet=SearchHeadline(
+                "lyrics",
+                query,
+                config=SEARCH_CONFIG,
+                start_sel="<mark>",
+                stop_sel="</mark>",
+                max_fragments=2,
+            ),
+        )
+        .order_by("-rank", "order", "id")
+    )
@@ -1,12 +1,50 @@
 from rest_framework import serializers
 from .models import Song, Category, SongBook
 
-class SongSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """Accepts a ``fields`` argument restricting output to the named fields."""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop("fields", None)
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+class SongSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    category_name = serializers.CharField(source="category.name", read_only=True)
+
+    class Meta:
+        model = Song
+        exclude = ["search_vector", "lyrics"]
+
+class SongSearchResultSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source="category.name", read_only=True)
+    rank = serializers.FloatField(read_only=True)
+    snippet = serializers.CharField(read_only=True)
 
     class Meta:
         model = Song
-        fields = "__all__"
+        fields = [
+            "id",
+            "title",
+            "melody",
+            "author",
+            "category",
+            "category_name",
+            "page_number",
+            "negative_page_number",
+            "rank",
+            "snippet",
+        ]
+
+class SongPageSerializer(serializers.ModelSerializer):
+    category_name = serializers.CharField(source="category.name", read_only=True)
+
+    class Meta:
+        model = Song
+        fields = ["id", "title", "category", "category_name", "page_number", "negative_page_number"]
 
 class CategorySerializer(serializers.ModelSerializer):
     songs = SongSerializer(many=True, read_only=True)
@@ -21,3 +59,8 @@ class SongBookSerializer(serializers.ModelSerializer):
     class Meta:
         model = SongBook
         fields = ["id", "name", "categories"]
+
+class CategorySummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Category
+        fields = ["id", "name", "order", "version"]
@@ -0,0 +1,164 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import Category, ContentVersion, Song, SongBook, Tombstone
+from .snapshot import invalidate_songbook_directory, invalidate_songbook_snapshot
+
+
+def _invalidate_songbook(songbook_id):
+    if songbook_id is None:
+        return
+    # Readers in every process notice the new content version on their own;
+    # dropping this process's copy just frees it early.
+    transaction.on_commit(partial(invalidate_songbook_snapshot, songbook_id))
+
+
+def _songbook_id_for_song(song):
+    if Song.category.is_cached(song):
+        return song.category.songbook_id
+    return Category.objects.filter(pk=song.category_id).values_list("songbook_id", flat=True).first()
+
+
+@receiver(post_save, sender=SongBook)
+@receiver(post_delete, sender=SongBook)
+def invalidate_songbook_on_change(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_songbook_directory)
+    _invalidate_songbook(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_songbook(sender, instance, **kwargs):
+    _invalidate_songbook(instance.songbook_id)
+
+
+@receiver(post_save, sender=Song)
+def invalidate_song_songbook(sender, instance, **kwargs):
+    _invalidate_songbook(_songbook_id_for_song(instance))
+
+
+def _is_cascade(instance, origin):
+    """Whether ``instance`` is deleted because its book or category is; ``origin`` is where the delete started."""
+    return origin is not None and getattr(origin, "model", type(origin)) is not type(instance)
+
+
+def _record_tombstones(songbook_id, objects, version=None):
+    """Write tombstones for ``(kind, object_id)`` pairs of one book with a single version and INSERT."""
+    if version is None:
+        version = ContentVersion.reserve()
+    Tombstone.objects.bulk_create(
+        [
+            Tombstone(kind=kind, object_id=object_id, songbook_id=songbook_id, version=version)
+            for kind, object_id in objects
+        ],
+        batch_size=1000,
+    )
+
+
+# A deleted book or category records its descendants' tombstones up front, in
+# bulk, instead of every cascaded row reserving a version and writing its own.
+@receiver(pre_delete, sender=SongBook)
+def record_songbook_tombstones(sender, instance, **kwargs):
+    categories = Category.objects.filter(songbook_id=instance.pk).values_list("id", flat=True)
+    songs = Song.objects.filter(category__songbook_id=instance.pk).values_list("id", flat=True)
+    _record_tombstones(
+        instance.pk,
+        [
+            (Tombstone.SONGBOOK, instance.pk),
+            *((Tombstone.CATEGORY, category_id) for category_id in categories),
+            *((Tombstone.SONG, song_id) for song_id in songs),
+        ],
+    )
+
+
+@receiver(pre_delete, sender=Category)
+def record_category_tombstones(sender, instance, origin=None, **kwargs):
+    if _is_cascade(instance, origin):
+        return
+    songs = Song.objects.filter(category_id=instance.pk).values_list("id", flat=True)
+    _record_tombstones(
+        instance.songbook_id,
+        [(Tombstone.CATEGORY, instance.pk), *((Tombstone.SONG, song_id) for song_id in songs)],
+    )
+
+
+@receiver(post_delete, sender=Song)
+def record_song_tombstone(sender, instance, origin=None, **kwargs):
+    if _is_cascade(instance, origin):
+        return
+    # Shares the songbook lookup with the snapshot invalidation.
+    songbook_id = _songbook_id_for_song(instance)
+    _invalidate_songbook(songbook_id)
+    if songbook_id is None:
+        return
+
+    Tombstone.objects.create(
+        kind=Tombstone.SONG,
+        object_id=instance.pk,
+        songbook_id=songbook_id,
+        version=ContentVersion.reserve(),
+    )
+
+
+def _moves(instance, raw, update_fields, field):
+    """Whether saving ``instance`` may change its parent ``field``; new rows have no old parent."""
+    if raw or instance._state.adding:
+        return False
+    return update_fields is None or field in update_fields or f"{field}_id" in update_fields
+
+
+def _record_move(old_songbook_id, new_songbook_id, objects, version):
+    """
+    Tell readers of the old book that ``objects`` left it.
+
+    A row moved to another book is neither newer in the old book nor deleted,
+    so without a tombstone neither its snapshot nor its change feed would
+    notice. Tombstones the new book holds for the same rows, from an earlier
+    move out of it, are dropped as the rows are back.
+    """
+    _record_tombstones(old_songbook_id, objects, version)
+    ids_by_kind = {}
+    for kind, object_id in objects:
+        ids_by_kind.setdefault(kind, []).append(object_id)
+    returned = Q()
+    for kind, object_ids in ids_by_kind.items():
+        returned |= Q(kind=kind, object_id__in=object_ids)
+    Tombstone.objects.filter(returned, songbook_id=new_songbook_id).delete()
+    _invalidate_songbook(old_songbook_id)
+
+
+# The admin can move a song to a category of another book, or a category to
+# another book. VersionedModel.save() has reserved the version by now.
+@receiver(pre_save, sender=Song)
+def record_song_move(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not _moves(instance, raw, update_fields, "category"):
+        return
+    stored = Song.objects.filter(pk=instance.pk).values_list("category_id", "category__songbook_id").first()
+    if stored is None or stored[0] == instance.category_id:
+        return
+    new_songbook_id = _songbook_id_for_song(instance)
+    if stored[1] != new_songbook_id:
+        _record_move(stored[1], new_songbook_id, [(Tombstone.SONG, instance.pk)], instance.version)
+
+
+@receiver(pre_save, sender=Category)
+def record_category_move(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not _moves(instance, raw, update_fields, "songbook"):
+        return
+    old_songbook_id = Category.objects.filter(pk=instance.pk).values_list("songbook_id", flat=True).first()
+    if old_songbook_id is None or old_songbook_id == instance.songbook_id:
+        return
+    songs = Song.objects.filter(category_id=instance.pk)
+    song_ids = list(songs.values_list("id", flat=True))
+    _record_move(
+        old_songbook_id,
+        instance.songbook_id,
+        [(Tombstone.CATEGORY, instance.pk), *((Tombstone.SONG, song_id) for song_id in song_ids)],
+        instance.version,
+    )
+    # The songs move along unchanged; restamp them so the new book's change feed includes them.
+    songs.update(version=instance.version)
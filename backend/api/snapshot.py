@@ -0,0 +1,348 @@
+import hashlib
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db.models import Exists, OuterRef, Prefetch, Q, Subquery
+
+from albins2.metrics import record_cache_lookup
+
+from .fast_serializers import category_header, category_rows, song_representations
+from .models import Category, ContentVersion, Song, SongBook, Tombstone
+from .renderers import render_json
+
+DIRECTORY_CACHE_KEY = "songbook:directory"
+SNAPSHOT_CACHE_KEY = "songbook:{songbook_id}:snapshot"
+SONG_FRAGMENT_KEY = "songbook:song:{song_id}:{version}:{category_version}"
+CATEGORY_FRAGMENT_KEY = "songbook:category:{category_id}:{version}"
+VARIANT_CACHE_KEY = "songbook:variant:{digest}:{variant}"
+# Up to this many missing fragments are fetched by id, more with one scan of the book.
+FRAGMENT_LOOKUP_LIMIT = 1000
+
+fragment_cache = caches["fragments"]
+
+
+def songbook_queryset():
+    """A book with everything SongBookSerializer reads, prefetched."""
+    return SongBook.objects.prefetch_related(
+        Prefetch(
+            "categories",
+            queryset=Category.objects.order_by("order", "id").prefetch_related(
+                Prefetch("songs", queryset=Song.objects.defer("search_vector").order_by("order", "id"))
+            ),
+        )
+    )
+
+
+def _directory_queryset():
+    return SongBook.objects.order_by("name", "id").values("id", "name", "slug")
+
+
+def get_songbook_directory(version=None):
+    """
+    Return the cached ``{"id", "name", "slug"}`` entries of every songbook, ordered by name.
+
+    The cached list is reloaded whenever the content version has moved on, so
+    a book created or renamed by another process shows up on the next read.
+    ``version`` saves the read when the caller already has the current one.
+    """
+    if version is None:
+        version = ContentVersion.current()
+    cached = cache.get(DIRECTORY_CACHE_KEY)
+    if cached is not None and cached["version"] == version:
+        return cached["entries"]
+    entries = list(_directory_queryset())
+    cache.set(DIRECTORY_CACHE_KEY, {"version": version, "entries": entries}, timeout=settings.SONGBOOK_SNAPSHOT_TIMEOUT)
+    return entries
+
+
+async def aget_songbook_directory(version=None):
+    if version is None:
+        version = await ContentVersion.acurrent()
+    cached = await cache.aget(DIRECTORY_CACHE_KEY)
+    if cached is not None and cached["version"] == version:
+        return cached["entries"]
+    entries = [entry async for entry in _directory_queryset()]
+    await cache.aset(
+        DIRECTORY_CACHE_KEY, {"version": version, "entries": entries}, timeout=settings.SONGBOOK_SNAPSHOT_TIMEOUT
+    )
+    return entries
+
+
+def invalidate_songbook_directory():
+    cache.delete(DIRECTORY_CACHE_KEY)
+
+
+def _find_songbook_id(directory, key):
+    if key is None:
+        key = settings.DEFAULT_SONGBOOK
+    if not key:
+        if len(directory) > 1:
+            raise SongBook.MultipleObjectsReturned
+        if not directory:
+            raise SongBook.DoesNotExist
+        return directory[0]["id"]
+
+    key = str(key)
+    for entry in directory:
+        if entry["slug"] == key:
+            return entry["id"]
+    for entry in directory:
+        if str(entry["id"]) == key:
+            return entry["id"]
+    raise SongBook.DoesNotExist
+
+
+def resolve_songbook_id(key=None, version=None):
+    """
+    Map a songbook slug or id to the songbook id using the cached directory.
+
+    Without a key the default book is used: the one named by the
+    DEFAULT_SONGBOOK setting, otherwise the only book there is. Raises
+    SongBook.DoesNotExist, or SongBook.MultipleObjectsReturned when there are
+    several books and no default.
+    """
+    return _find_songbook_id(get_songbook_directory(version), key)
+
+
+async def aresolve_songbook_id(key=None, version=None):
+    return _find_songbook_id(await aget_songbook_directory(version), key)
+
+
+def _song_fragment_key(song_id, version, category_version):
+    # Songs embed their category's name, so a category edit changes them too.
+    return SONG_FRAGMENT_KEY.format(song_id=song_id, version=version, category_version=category_version)
+
+
+def _category_fragment_key(category_id, version):
+    return CATEGORY_FRAGMENT_KEY.format(category_id=category_id, version=version)
+
+
+def _category_header(category):
+    """The category's JSON object up to and including the opening bracket of its song list."""
+    # Re-open the object: '{...}' becomes '{...,"songs":['; songs is CategorySerializer's last field.
+    return render_json(category_header(category))[:-1] + b',"songs":['
+
+
+def _render_song_fragments(songbook_id, missing, categories):
+    """Render the songs whose fragments are missing; ``missing`` maps song id to cache key."""
+    songs = Song.objects.filter(category__songbook_id=songbook_id)
+    if len(missing) <= FRAGMENT_LOOKUP_LIMIT:
+        songs = songs.filter(pk__in=list(missing))
+
+    category_names = {category_id: category["name"] for category_id, category in categories.items()}
+    return {
+        missing[song_id]: render_json(data)
+        for song_id, data in song_representations(songs, category_names)
+        if song_id in missing
+    }
+
+
+def build_songbook_snapshot(songbook_id, version=None):
+    """
+    Render one songbook to JSON bytes from cached per-song and per-category fragments.
+
+    Fragments are keyed by the row's version, so after an edit only the
+    changed rows are serialized again and the rest is a byte join. Missing
+    fragments are built from plain rows (api/fast_serializers.py), yet the
+    output is identical to rendering SongBookSerializer. ``version`` is the
+    content version read before the call, if the caller has one. Raises
+    SongBook.DoesNotExist.
+
+    The payload ends with the book's own version, the newest of its rows and
+    tombstones up to ``version``, so writes to other books leave its bytes
+    and ETag alone; clients pass it to the change feed as ``since``.
+    """
+    # Read the version first: rows committed while we serialize are newer than
+    # it, so they are at most sent again by the next delta sync, never skipped.
+    if version is None:
+        version = ContentVersion.current()
+    deleted = Tombstone.objects.filter(songbook_id=OuterRef("pk"), version__lte=version).order_by("-version")
+    songbook = (
+        SongBook.objects.annotate(deleted_version=Subquery(deleted.values("version")[:1]))
+        .values("id", "name", "version", "deleted_version")
+        .get(pk=songbook_id)
+    )
+    ordered_categories = list(category_rows(songbook_id))
+    categories = {category["id"]: category for category in ordered_categories}
+    song_rows = (
+        Song.objects.filter(category__songbook_id=songbook_id)
+        .order_by("order", "id")
+        .values_list("id", "version", "category_id")
+    )
+
+    row_versions = [songbook["version"], songbook["deleted_version"] or 0]
+    row_versions.extend(category["version"] for category in ordered_categories)
+    song_keys = {}
+    songs_by_category = {category_id: [] for category_id in categories}
+    for song_id, song_version, category_id in song_rows:
+        row_versions.append(song_version)
+        key = _song_fragment_key(song_id, song_version, categories[category_id]["version"])
+        song_keys[song_id] = key
+        songs_by_category[category_id].append(key)
+    category_keys = {
+        category_id: _category_fragment_key(category_id, category["version"]) for category_id, category in categories.items()
+    }
+
+    fragments = fragment_cache.get_many([*song_keys.values(), *category_keys.values()])
+    record_cache_lookup("songbook_fragment", len(fragments) == len(song_keys) + len(category_keys))
+
+    rendered = {}
+    missing = {song_id: key for song_id, key in song_keys.items() if key not in fragments}
+    if missing:
+        rendered.update(_render_song_fragments(songbook_id, missing, categories))
+    for category in ordered_categories:
+        key = category_keys[category["id"]]
+        if key not in fragments:
+            rendered[key] = _category_header(category)
+    if rendered:
+        fragment_cache.set_many(rendered, timeout=settings.SONGBOOK_SNAPSHOT_TIMEOUT)
+        fragments.update(rendered)
+
+    body = b",".join(
+        fragments[category_keys[category["id"]]]
+        + b",".join(fragments[key] for key in songs_by_category[category["id"]])
+        + b"]}"
+        for category in ordered_categories
+    )
+    head = render_json({"id": songbook["id"], "name": songbook["name"]})[:-1]
+    book_version = max((row_version for row_version in row_versions if row_version <= version), default=0)
+    return head + b',"categories":[' + body + b'],"version":' + render_json(book_version) + b"}"
+
+
+def _changed_since(songbook_id, version):
+    """Rows of the book written after ``version``; each check is a range scan of a version index."""
+    changed = (
+        Q(version__gt=version)
+        | Exists(Category.objects.filter(songbook_id=OuterRef("pk"), version__gt=version))
+        | Exists(Song.objects.filter(category__songbook_id=OuterRef("pk"), version__gt=version))
+        | Exists(Tombstone.objects.filter(songbook_id=OuterRef("pk"), version__gt=version))
+    )
+    return SongBook.objects.filter(changed, pk=songbook_id)
+
+
+def _make_snapshot(payload, version, previous):
+    etag = f'"{hashlib.sha256(payload).hexdigest()}"'
+    # A rebuild with the same content, e.g. after an eviction, keeps its Last-Modified.
+    if previous is not None and previous["etag"] == etag:
+        changed_at = previous["last_modified"]
+    else:
+        changed_at = int(time.time())
+    return {"payload": payload, "etag": etag, "last_modified": changed_at, "version": version}
+
+
+def get_songbook_snapshot(songbook_id, version=None):
+    """
+    Return the cached snapshot of one songbook, rebuilding it when the book has changed.
+
+    The snapshot is a dict with the rendered ``payload`` bytes, a strong
+    ``etag`` derived from the payload, the ``last_modified`` timestamp of its
+    first build and the content ``version`` it was last checked at. A cached
+    snapshot is only served while the content version is unchanged; after any
+    write, in any process, one query decides whether this book was touched and
+    either restamps the snapshot or rebuilds it. So caches need not be shared
+    between workers and commands to stay correct. ``version`` saves the read
+    when the caller already has the current one.
+    """
+    if version is None:
+        version = ContentVersion.current()
+    key = SNAPSHOT_CACHE_KEY.format(songbook_id=songbook_id)
+    snapshot = cache.get(key)
+    if snapshot is not None and snapshot["version"] == version:
+        record_cache_lookup("songbook_snapshot", True)
+        return snapshot
+
+    unchanged = snapshot is not None and not _changed_since(songbook_id, snapshot["version"]).exists()
+    record_cache_lookup("songbook_snapshot", unchanged)
+    if unchanged:
+        snapshot = {**snapshot, "version": version}
+    else:
+        snapshot = _make_snapshot(build_songbook_snapshot(songbook_id, version), version, snapshot)
+    cache.set(key, snapshot, timeout=settings.SONGBOOK_SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+async def aget_songbook_snapshot(songbook_id, version=None):
+    """Async variant of get_songbook_snapshot() built on the async cache API."""
+    if version is None:
+        version = await ContentVersion.acurrent()
+    key = SNAPSHOT_CACHE_KEY.format(songbook_id=songbook_id)
+    snapshot = await cache.aget(key)
+    if snapshot is not None and snapshot["version"] == version:
+        record_cache_lookup("songbook_snapshot", True)
+        return snapshot
+
+    unchanged = snapshot is not None and not await _changed_since(songbook_id, snapshot["version"]).aexists()
+    record_cache_lookup("songbook_snapshot", unchanged)
+    if unchanged:
+        snapshot = {**snapshot, "version": version}
+    else:
+        # Assembling the payload is sync code; build it in a thread.
+        payload = await sync_to_async(build_songbook_snapshot)(songbook_id, version)
+        snapshot = _make_snapshot(payload, version, snapshot)
+    await cache.aset(key, snapshot, timeout=settings.SONGBOOK_SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def _encode_variant(snapshot, encode):
+    return encode(json.loads(snapshot["payload"]))
+
+
+def _variant(snapshot, variant, payload):
+    return {**snapshot, "payload": payload, "etag": f'{snapshot["etag"][:-1]}-{variant}"'}
+
+
+def get_snapshot_variant(snapshot, variant, encode):
+    """
+    Return ``snapshot`` with its payload re-encoded by ``encode(data)``, e.g. as MessagePack.
+
+    Variants are cached by the JSON payload's hash, so they never go stale and
+    need no invalidation. Each variant gets its own ETag.
+    """
+    key = VARIANT_CACHE_KEY.format(digest=snapshot["etag"].strip('"'), variant=variant)
+    payload = cache.get(key)
+    record_cache_lookup("songbook_variant", payload is not None)
+    if payload is None:
+        payload = _encode_variant(snapshot, encode)
+        cache.set(key, payload, timeout=settings.SONGBOOK_SNAPSHOT_TIMEOUT)
+    return _variant(snapshot, variant, payload)
+
+
+async def aget_snapshot_variant(snapshot, variant, encode):
+    """Async variant of get_snapshot_variant() built on the async cache API."""
+    key = VARIANT_CACHE_KEY.format(digest=snapshot["etag"].strip('"'), variant=variant)
+    payload = await cache.aget(key)
+    record_cache_lookup("songbook_variant", payload is not None)
+    if payload is None:
+        payload = await sync_to_async(_encode_variant)(snapshot, encode)
+        await cache.aset(key, payload, timeout=settings.SONGBOOK_SNAPSHOT_TIMEOUT)
+    return _variant(snapshot, variant, payload)
+
+
+def invalidate_songbook_snapshot(songbook_id):
+    """
+    Drop this process's cached snapshot of one songbook; other books keep theirs.
+
+    Reads already notice changes through the content version, so this only
+    saves the next reader the check and frees the memory early.
+    """
+    cache.delete(SNAPSHOT_CACHE_KEY.format(songbook_id=songbook_id))
+
+
+def invalidate_songbook_fragments(songbook_id):
+    """Drop the cached fragments of one book's current rows, so its next build renders every row."""
+    categories = dict(Category.objects.filter(songbook_id=songbook_id).values_list("id", "version"))
+    songs = Song.objects.filter(category_id__in=list(categories)).values_list("id", "version", "category_id")
+    fragment_cache.delete_many(
+        [
+            *(_category_fragment_key(category_id, version) for category_id, version in categories.items()),
+            *(_song_fragment_key(song_id, version, categories[category_id]) for song_id, version, category_id in songs),
+        ]
+    )
+
+
+def invalidate_all_songbook_snapshots():
+    for songbook_id in SongBook.objects.values_list("id", flat=True):
+        invalidate_songbook_snapshot(songbook_id)
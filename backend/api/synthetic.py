@@ -0,0 +1,222 @@
+"""Deterministic synthetic songbooks for load and scale testing."""
+
+import csv
+import io
+import random
+import time
+from dataclasses import dataclass
+from functools import partial
+
+from django.db import connection, transaction
+
+from .models import ORDER_STEP, Category, ContentVersion, Song, SongBook, unique_slug
+from .snapshot import invalidate_songbook_directory, invalidate_songbook_fragments, invalidate_songbook_snapshot
+
+WORDS = (
+    "helan går sjung hopp faderallan lej den som inte helan tar han heller inte "
+    "halvan får nu tar vi den vid bordet glasen höjs kväll sommar natt stjärna "
+    "laulu ilta kesä tähti ystävä koti meri tuuli song night star friend home sea "
+    "wind morning bright old road river light heart"
+).split()
+
+
+@dataclass
+class GenerationStats:
+    songbooks: int = 0
+    categories: int = 0
+    songs: int = 0
+    elapsed: float = 0.0
+
+    def __str__(self):
+        return (
+            f"{self.songs} songs in {self.categories} categories across {self.songbooks} songbooks "
+            f"in {self.elapsed:.2f}s"
+        )
+
+
+LINE_POOL_SIZE = 4096
+
+
+def _phrase(rng, low, high):
+    return " ".join(rng.choices(WORDS, k=rng.randint(low, high)))
+
+
+def line_pool(rng, size=LINE_POOL_SIZE):
+    """Lyric lines that songs draw from; picking whole lines keeps generation cheap."""
+    return [_phrase(rng, 3, 7).capitalize() for _ in range(size)]
+
+
+def synthetic_lyrics(rng, pool, lines, stanza_lines):
+    """
+    Return ``(content, lyrics, line_count, stanza_count)`` for a song of ``lines`` lines.
+
+    The HTML uses the importer's layout, one paragraph per line and an empty
+    one between stanzas, so the derived fields equal what extract_lyrics()
+    would produce without having to parse anything.
+    """
+    picked = rng.choices(pool, k=lines)
+    stanzas = [picked[start:start + stanza_lines] for start in range(0, lines, stanza_lines)]
+    content = "<p></p>".join("".join(f"<p>{line}</p>" for line in stanza) for stanza in stanzas)
+    lyrics = "\n\n".join("\n".join(stanza) for stanza in stanzas)
+    return content, lyrics, lines, len(stanzas)
+
+
+SONG_COLUMNS = (
+    "title",
+    "melody",
+    "author",
+    "content",
+    "lyrics",
+    "line_count",
+    "stanza_count",
+    "audio",
+    "category_id",
+    "page_number",
+    "negative_page_number",
+    "order",
+    "version",
+)
+
+
+def copy_songs(rows):
+    """
+    Write song rows (tuples in SONG_COLUMNS order) with a single COPY.
+
+    COPY skips the per-row work of INSERT, which matters here because every
+    song row also feeds the generated search vector and its GIN index. In CSV
+    format an unquoted empty field is NULL, so ``None`` values become NULL.
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    columns = ", ".join(connection.ops.quote_name(column) for column in SONG_COLUMNS)
+    with connection.cursor() as cursor:
+        cursor.cursor.copy_expert(
+            f"COPY {connection.ops.quote_name(Song._meta.db_table)} ({columns}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+    return len(rows)
+
+
+def delete_songbooks(names):
+    """
+    Remove the named books with plain SQL DELETEs; synthetic data needs no signals or tombstones.
+
+    The cached snapshots and fragments of the removed books are dropped too,
+    since nothing else will notice that these rows are gone.
+    """
+    ids = list(SongBook.objects.filter(name__in=names).values_list("id", flat=True))
+    if not ids:
+        return
+    for songbook_id in ids:
+        invalidate_songbook_fragments(songbook_id)
+
+    quote = connection.ops.quote_name
+    songs, categories, songbooks = (quote(model._meta.db_table) for model in (Song, Category, SongBook))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {songs} WHERE {quote('category_id')} IN "
+            f"(SELECT {quote('id')} FROM {categories} WHERE {quote('songbook_id')} = ANY(%s))",
+            [ids],
+        )
+        cursor.execute(f"DELETE FROM {categories} WHERE {quote('songbook_id')} = ANY(%s)", [ids])
+        cursor.execute(f"DELETE FROM {songbooks} WHERE {quote('id')} = ANY(%s)", [ids])
+
+    transaction.on_commit(invalidate_songbook_directory)
+    for songbook_id in ids:
+        transaction.on_commit(partial(invalidate_songbook_snapshot, songbook_id))
+
+
+def generate_songbooks(
+    books=1,
+    categories=10,
+    songs=100,
+    lyric_lines=16,
+    stanza_lines=4,
+    audio_ratio=0.0,
+    seed=0,
+    prefix="Synthetic",
+    batch_size=10000,
+    replace=False,
+):
+    """
+    Create ``books`` songbooks of ``categories`` x ``songs`` songs each.
+
+    The same arguments always produce the same rows. Lyric length varies
+    between half and one and a half times ``lyric_lines``, and about
+    ``audio_ratio`` of the songs reference an audio file (the file itself
+    is not created). Books and categories are written with bulk_create,
+    songs with COPY in batches of ``batch_size``; all rows share a single
+    content version.
+    """
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    pool = line_pool(rng)
+    stats = GenerationStats()
+    names = [f"{prefix} {number}" for number in range(1, books + 1)]
+
+    with transaction.atomic():
+        if replace:
+            delete_songbooks(names)
+        version = ContentVersion.reserve()
+
+        # bulk_create() skips SongBook.save(), so pick free slugs here.
+        taken = set(SongBook.objects.values_list("slug", flat=True))
+        new_books = []
+        for name in names:
+            new_books.append(SongBook(name=name, slug=unique_slug(name, taken), version=version))
+            taken.add(new_books[-1].slug)
+        songbooks = SongBook.objects.bulk_create(new_books)
+        new_categories = Category.objects.bulk_create(
+            [
+                Category(
+                    name=f"{_phrase(rng, 1, 3).title()} {number}",
+                    songbook=songbook,
+                    order=number * ORDER_STEP,
+                    version=version,
+                )
+                for songbook in songbooks
+                for number in range(1, categories + 1)
+            ],
+            batch_size=batch_size,
+        )
+        stats.songbooks, stats.categories = len(songbooks), len(new_categories)
+
+        pending = []
+        page_by_book = {}
+        for category in new_categories:
+            for number in range(1, songs + 1):
+                page = page_by_book[category.songbook_id] = page_by_book.get(category.songbook_id, 0) + 1
+                lines = rng.randint(max(lyric_lines // 2, 1), max(lyric_lines * 3 // 2, 1))
+                content, lyrics, line_count, stanza_count = synthetic_lyrics(rng, pool, lines, stanza_lines)
+                has_audio = rng.random() < audio_ratio
+                pending.append(
+                    (
+                        _phrase(rng, 2, 5).capitalize(),
+                        _phrase(rng, 1, 4).title(),
+                        _phrase(rng, 2, 2).title(),
+                        content,
+                        lyrics,
+                        line_count,
+                        stanza_count,
+                        f"songs/audio/synthetic-{category.songbook_id}-{page}.mp3" if has_audio else None,
+                        category.id,
+                        page,
+                        -page if page % 7 == 0 else None,
+                        number * ORDER_STEP,
+                        version,
+                    )
+                )
+                if len(pending) >= batch_size:
+                    stats.songs += copy_songs(pending)
+                    pending = []
+        if pending:
+            stats.songs += copy_songs(pending)
+
+        # Bulk writes bypass the model signals that normally drop cached books.
+        transaction.on_commit(invalidate_songbook_directory)
+        for songbook in songbooks:
+            transaction.on_commit(partial(invalidate_songbook_snapshot, songbook.id))
+
+    stats.elapsed = time.perf_counter() - started
+    return stats
@@ -0,0 +1,17 @@
+"""Helpers shared by the test modules."""
+
+from django.core.cache import cache
+
+
+class ClearCacheMixin:
+    """
+    Start every test with an empty default cache.
+
+    Content versions are reserved inside each test's transaction and roll back
+    with it, so the next test hands out the same numbers again. A book cached
+    at one of them by an earlier test would be served as current.
+    """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
@@ -1,11 +1,42 @@
+import gzip
+import io
+import json
+import tempfile
+import threading
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib import admin
 from django.contrib.auth import get_user_model
-from django.db import IntegrityError
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, OperationalError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, APITestCase, force_authenticate
+
+from albins2.db.base import DatabaseWrapper as PooledDatabaseWrapper
+from albins2.metrics import REGISTRY
+from albins2.timing import reset_timing_summary, timing_summary
 
-from .models import Category, Song, SongBook
+from .benchmark import QueryBudget, Result, check_budgets, run_benchmarks
+from .export import export_changes, export_songbook, export_songbooks
+from .fast_serializers import category_header, category_rows, song_representations
+from .importer import BulkSongImporter, bulk_import_songs, iter_song_entries
+from .lyrics import extract_lyrics
+from .models import Category, ContentVersion, Song, SongBook, Tombstone
+from .pages import find_page_collisions
+from .renderers import FastJSONRenderer, msgpack, render_json, to_columns
+from .serializers import CategorySerializer, SongBookSerializer, SongSerializer
+from .snapshot import SNAPSHOT_CACHE_KEY, build_songbook_snapshot, get_songbook_snapshot, songbook_queryset
+from .synthetic import generate_songbooks
+from .testing import ClearCacheMixin
+from .views import AsyncSongBookDetailView
+from .viewsets import AsyncSongViewSet
 
 
 class CategoryModelTests(TestCase):
@@ -52,6 +83,25 @@ class SongModelTests(TestCase):
         self.assertEqual(first.order, 10)
         self.assertEqual(second.order, 20)
 
+    def test_saving_no_fields_writes_nothing(self):
+        song = Song.objects.create(title="Untouched", category=self.category)
+        version = ContentVersion.current()
+
+        with self.assertNumQueries(0):
+            song.save(update_fields=[])
+
+        self.assertEqual(ContentVersion.current(), version)
+        self.assertEqual(song.version, version)
+
+    def test_order_is_computed_by_the_insert(self):
+        Song.objects.create(title="Placed", category=self.category, order=40)
+
+        # Savepoint, version reservation and the INSERT that assigns the order.
+        with self.assertNumQueries(4):
+            song = Song.objects.create(title="Appended", category=self.category)
+
+        self.assertEqual(song.order, 50)
+
     def test_respects_explicit_order(self):
         song = Song.objects.create(title="Special Number", category=self.category, order=3)
 
@@ -77,6 +127,35 @@ class SongModelTests(TestCase):
         self.assertIsNone(song.page_number)
         self.assertEqual(song.negative_page_number, -12)
 
+    def test_derives_plain_text_lyrics_from_content(self):
+        song = Song.objects.create(
+            title="Two Stanzas",
+            category=self.category,
+            content="<p>First &amp; line</p><p><em>Second</em> line</p><p></p><p>Chorus<br>again</p>",
+        )
+
+        self.assertEqual(song.lyrics, "First & line\nSecond line\n\nChorus\nagain")
+        self.assertEqual((song.line_count, song.stanza_count), (4, 2))
+
+    def test_lyrics_follow_content_in_partial_saves(self):
+        song = Song.objects.create(title="Partial", category=self.category, content="<p>Old</p>")
+        song.content = "<p>New</p><p>Lines</p>"
+        song.save(update_fields=["content"])
+
+        song.refresh_from_db()
+        self.assertEqual((song.lyrics, song.line_count), ("New\nLines", 2))
+
+    def test_backfill_command_recomputes_stale_lyrics(self):
+        song = Song.objects.create(title="Stale", category=self.category, content="<p>Fresh words</p>")
+        Song.objects.filter(pk=song.pk).update(lyrics="", line_count=0, stanza_count=0)
+
+        out = io.StringIO()
+        call_command("backfill_lyrics", stdout=out)
+
+        song.refresh_from_db()
+        self.assertEqual(song.lyrics, "Fresh words")
+        self.assertIn("Updated lyrics for 1 songs", out.getvalue())
+
     def test_coerces_signs_when_both_provided(self):
         song = Song.objects.create(
             title="Matching Pair",
@@ -89,8 +168,285 @@ class SongModelTests(TestCase):
         self.assertEqual(song.negative_page_number, -9)
 
 
-class SongBookAPITests(APITestCase):
+class ConcurrentOrderAllocationTests(TransactionTestCase):
+    WORKERS = 6
+    SAVES_PER_WORKER = 10
+
+    def _hammer(self, create):
+        barrier = threading.Barrier(self.WORKERS)
+        errors = []
+
+        def worker(worker_id):
+            try:
+                barrier.wait()
+                for index in range(self.SAVES_PER_WORKER):
+                    create(f"{worker_id}-{index}")
+            except Exception as exc:  # pragma: no cover - surfaced by the assertion below
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(worker_id,)) for worker_id in range(self.WORKERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+
+    def _expected_orders(self):
+        return list(range(10, (self.WORKERS * self.SAVES_PER_WORKER + 1) * 10, 10))
+
+    def test_concurrent_song_saves_get_distinct_orders(self):
+        category = Category.objects.create(name="Hammered", songbook=SongBook.objects.create(name="Busy Book"))
+
+        self._hammer(lambda title: Song.objects.create(title=title, category=category))
+
+        orders = sorted(Song.objects.filter(category=category).values_list("order", flat=True))
+        self.assertEqual(orders, self._expected_orders())
+
+    def test_concurrent_category_saves_get_distinct_orders(self):
+        songbook = SongBook.objects.create(name="Busy Book")
+
+        self._hammer(lambda name: Category.objects.create(name=name, songbook=songbook))
+
+        orders = sorted(songbook.categories.values_list("order", flat=True))
+        self.assertEqual(orders, self._expected_orders())
+
+
+class BulkImportTests(TestCase):
+    @staticmethod
+    def _entries(count, category="Snapsvisor"):
+        return [
+            {"title": f"Song {index}", "category": category, "text": f"Line {index}\nRefrain", "page": index + 1}
+            for index in range(count)
+        ]
+
+    def test_categories_created_elsewhere_are_not_counted_as_created(self):
+        songbook = SongBook.objects.create(name="Albins")
+        importer = BulkSongImporter(songbook)
+        Category.objects.create(name="Marscher", songbook=songbook)
+
+        importer.import_batch(self._entries(1) + self._entries(1, category="Marscher"))
+
+        self.assertEqual((importer.stats.categories_created, importer.stats.categories_existing), (1, 1))
+        self.assertEqual(songbook.categories.count(), 2)
+
+    def test_creates_categories_and_songs_with_in_memory_order(self):
+        stats = bulk_import_songs(self._entries(3) + self._entries(2, category="Marscher"))
+
+        self.assertEqual(stats.categories_created, 2)
+        self.assertEqual(stats.songs_created, 5)
+        category = Category.objects.get(name="Snapsvisor")
+        songs = list(category.songs.order_by("order"))
+        self.assertEqual([song.order for song in songs], [10, 20, 30])
+        self.assertEqual(songs[1].content, "<p>Line 1</p><p>Refrain</p>")
+        self.assertEqual(songs[1].lyrics, "Line 1\nRefrain")
+        self.assertEqual(songs[1].page_number, 2)
+
+    def test_updates_changed_songs_and_skips_unchanged_ones(self):
+        bulk_import_songs(self._entries(3))
+        entries = self._entries(3)
+        entries[0]["melody"] = "New melody"
+
+        stats = bulk_import_songs(entries)
+
+        self.assertEqual((stats.songs_created, stats.songs_updated, stats.songs_unchanged), (0, 1, 2))
+        self.assertEqual(Song.objects.get(title="Song 0").melody, "New melody")
+        self.assertEqual(Song.objects.count(), 3)
+
+    def test_query_count_does_not_grow_with_source_size(self):
+        SongBook.objects.create(name="Albins")
+
+        with CaptureQueriesContext(connection) as small_import:
+            bulk_import_songs(self._entries(5))
+        with CaptureQueriesContext(connection) as large_import:
+            bulk_import_songs(self._entries(500, category="Other"))
+
+        self.assertEqual(len(large_import.captured_queries), len(small_import.captured_queries))
+
+
+class StreamingImportTests(TestCase):
+    ENTRIES = [
+        {"title": "Array [one]", "category": "Visor", "text": "a\nb", "page": 4},
+        {"title": "Array {two}", "category": "Visor", "text": "c", "pageNumber": 5},
+        {"title": "Flipped", "category": "Visor", "text": "d", "flipped_page_number": 6},
+    ]
+
+    def test_iterates_json_array_across_chunk_boundaries(self):
+        source = io.StringIO(json.dumps(self.ENTRIES, indent=2))
+
+        with mock.patch("api.importer.READ_CHUNK_SIZE", 8):
+            self.assertEqual(list(iter_song_entries(source)), self.ENTRIES)
+
+    def test_iterates_json_lines(self):
+        source = io.StringIO("\n".join(json.dumps(entry) for entry in self.ENTRIES) + "\n\n")
+
+        self.assertEqual(list(iter_song_entries(source)), self.ENTRIES)
+
+    def test_streamed_import_in_batches_keeps_page_aliases(self):
+        source = io.StringIO(json.dumps(self.ENTRIES))
+
+        stats = bulk_import_songs(iter_song_entries(source), batch_size=2)
+
+        self.assertEqual(stats.songs_created, 3)
+        pages = dict(Song.objects.values_list("title", "page_number"))
+        self.assertEqual(pages, {"Array [one]": 4, "Array {two}": 5, "Flipped": None})
+        self.assertEqual(Song.objects.get(title="Flipped").negative_page_number, -6)
+
+
+class SyntheticSongbookTests(ClearCacheMixin, TestCase):
+    def test_generates_requested_shape_with_derived_lyrics(self):
+        stats = generate_songbooks(books=2, categories=3, songs=4, audio_ratio=1.0, batch_size=5)
+
+        self.assertEqual((stats.songbooks, stats.categories, stats.songs), (2, 6, 24))
+        songbook = SongBook.objects.get(name="Synthetic 2")
+        self.assertEqual(songbook.slug, "synthetic-2")
+        songs = Song.objects.filter(category__songbook=songbook).order_by("page_number")
+        self.assertEqual([song.page_number for song in songs], list(range(1, 13)))
+        self.assertEqual(songs.get(page_number=7).negative_page_number, -7)
+        for song in songs:
+            self.assertEqual((song.lyrics, song.line_count, song.stanza_count), extract_lyrics(song.content))
+            self.assertTrue(song.audio.name.startswith("songs/audio/synthetic-"))
+
+    def test_same_seed_produces_same_rows(self):
+        def generate():
+            generate_songbooks(categories=2, songs=5, seed=7, replace=True)
+            return list(Song.objects.order_by("page_number").values_list("title", "content", "page_number"))
+
+        self.assertEqual(generate(), generate())
+
+    def test_replacing_books_drops_their_cached_snapshots(self):
+        generate_songbooks(categories=1, songs=2)
+        old_id = SongBook.objects.get(name="Synthetic 1").id
+        get_songbook_snapshot(old_id)
+        self.assertIsNotNone(cache.get(SNAPSHOT_CACHE_KEY.format(songbook_id=old_id)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            generate_songbooks(categories=1, songs=3, replace=True)
+
+        self.assertFalse(SongBook.objects.filter(id=old_id).exists())
+        self.assertIsNone(cache.get(SNAPSHOT_CACHE_KEY.format(songbook_id=old_id)))
+        self.assertEqual(Song.objects.count(), 3)
+
+    def test_command_refuses_to_overwrite_without_replace(self):
+        call_command("generate_songbooks", categories=1, songs=1, stdout=io.StringIO())
+
+        with self.assertRaises(CommandError):
+            call_command("generate_songbooks", categories=1, songs=1, stdout=io.StringIO())
+        call_command("generate_songbooks", categories=1, songs=2, replace=True, stdout=io.StringIO())
+        self.assertEqual(Song.objects.count(), 2)
+
+
+class BenchmarkTests(TestCase):
+    def test_small_run_meets_query_budgets(self):
+        report = run_benchmarks(sizes=(20, 60), iterations=2)
+
+        self.assertEqual(report["failures"], [])
+        scenarios = {result["scenario"] for result in report["results"]}
+        self.assertEqual(
+            scenarios,
+            {
+                "songbook_cold",
+                "songbook_assemble",
+                "songbook_warm",
+                "songs_list",
+                "songs_retrieve",
+                "anonymous_login",
+                "importer",
+                "decode_json",
+                "decode_json_gzip",
+                "decode_msgpack_columns",
+                "decode_msgpack_columns_gzip",
+                "decode_msgpack_rows",
+                "decode_msgpack_rows_gzip",
+            },
+        )
+        sizes = {result["scenario"]: result["payload_bytes"] for result in report["results"] if result["size"] == 60}
+        self.assertLess(sizes["decode_msgpack_columns"], sizes["decode_json"])
+        self.assertFalse(SongBook.objects.filter(name__startswith="Benchmark").exists())
+
+    def test_budget_check_reports_growing_query_counts(self):
+        def result(size, queries):
+            return Result("songbook_cold", size, 1, 1.0, 1.0, 1.0, 1.0, queries, 0, [200])
+
+        failures = check_budgets([result(10, 3), result(100, 4)], {"songbook_cold": QueryBudget(5)})
+
+        self.assertEqual(failures, ["songbook_cold: query count grows with size {10: 3, 100: 4}"])
+
+
+class StaticExportTests(ClearCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        static_root = tempfile.TemporaryDirectory()
+        self.addCleanup(static_root.cleanup)
+        self.root = Path(static_root.name)
+        settings_override = override_settings(STATIC_ROOT=static_root.name, SONGBOOK_STATIC_EXPORT=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.songbook = SongBook.objects.create(name="Albins")
+        self.category = Category.objects.create(name="Snapsvisor", songbook=self.songbook)
+        Song.objects.create(title="Helan går", category=self.category, content="<p>Helan går</p>")
+
+    def pointer(self):
+        return json.loads((self.root / "songbooks/books/albins.json").read_text())
+
+    def test_writes_hashed_precompressed_payload_and_pointers(self):
+        export_songbooks()
+
+        pointer = self.pointer()
+        payload = (self.root / "songbooks/books" / f"albins.{pointer['hash']}.json").read_bytes()
+        self.assertEqual(pointer["url"], f"/api/static/songbooks/books/albins.{pointer['hash']}.json")
+        self.assertEqual(json.loads(payload)["name"], "Albins")
+        self.assertEqual(
+            gzip.decompress((self.root / "songbooks/books" / f"albins.{pointer['hash']}.json.gz").read_bytes()),
+            payload,
+        )
+        index = json.loads((self.root / "songbooks/index.json").read_text())
+        self.assertEqual(index["default"], "albins")
+        self.assertEqual([book["hash"] for book in index["songbooks"]], [pointer["hash"]])
+
+    def test_saves_do_not_export(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Song.objects.create(title="Nu tar vi den", category=self.category)
+
+        self.assertFalse((self.root / "songbooks").exists())
+
+    def test_changed_books_are_exported_and_old_payloads_pruned(self):
+        other = SongBook.objects.create(name="Other")
+        version = export_changes()
+        first = self.pointer()["hash"]
+        other_pointer = json.loads((self.root / "songbooks/books/other.json").read_text())
+
+        self.assertEqual(export_changes(version), version)
+        Song.objects.create(title="Tredje", category=self.category, content="<p>Tredje</p>")
+        version = export_changes(version)
+        Song.objects.create(title="Fjärde", category=self.category, content="<p>Fjärde</p>")
+        with mock.patch("api.export.export_songbook", wraps=export_songbook) as export:
+            export_changes(version)
+
+        self.assertEqual([call.args for call in export.call_args_list], [(self.songbook.pk,)])
+        self.assertEqual(json.loads((self.root / "songbooks/books/other.json").read_text()), other_pointer)
+        payloads = sorted(path.name for path in (self.root / "songbooks/books").glob("albins.*.json"))
+        self.assertEqual(len(payloads), 2)
+        self.assertNotIn(f"albins.{first}.json", payloads)
+        self.assertIn(f"albins.{self.pointer()['hash']}.json", payloads)
+
+    def test_deleted_book_is_removed_from_export(self):
+        version = export_changes()
+
+        self.songbook.delete()
+        export_changes(version)
+
+        self.assertEqual(list((self.root / "songbooks/books").iterdir()), [])
+        index = json.loads((self.root / "songbooks/index.json").read_text())
+        self.assertEqual(index, {"default": None, "songbooks": []})
+
+
+class SongBookAPITests(ClearCacheMixin, APITestCase):
     def setUp(self):
+        super().setUp()
         self.user = get_user_model().objects.create_user(username="test-user", password="password123")
         self.songbook = SongBook.objects.create(name="Seasonal Favorites")
         self.first_category = Category.objects.create(name="Advent", songbook=self.songbook, order=10)
@@ -111,9 +467,10 @@ class SongBookAPITests(APITestCase):
         response = self.client.get(url)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data["id"], self.songbook.id)
-        self.assertEqual(response.data["name"], self.songbook.name)
-        categories = response.data["categories"]
+        payload = response.json()
+        self.assertEqual(payload["id"], self.songbook.id)
+        self.assertEqual(payload["name"], self.songbook.name)
+        categories = payload["categories"]
         self.assertEqual(len(categories), 2)
         self.assertEqual([category["name"] for category in categories], ["Advent", "Easter"])
         self.assertEqual([song["title"] for song in categories[0]["songs"]], ["Alpha Song", "Beta Song"])
@@ -127,6 +484,571 @@ class SongBookAPITests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
         self.assertIn("Multiple songbooks", response.data["detail"])
 
+    def test_songbook_endpoint_serves_cached_snapshot(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse("songbook-detail")
+        first = self.client.get(url)
+
+        # Only the content version the cached book is checked against.
+        with self.assertNumQueries(1):
+            second = self.client.get(url)
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.content, first.content)
+
+    def test_songbook_snapshot_is_invalidated_on_change(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse("songbook-detail")
+        self.client.get(url)
+
+        self.alpha_song.title = "Renamed Song"
+        self.alpha_song.save()
+        self.gamma_song.delete()
+
+        payload = self.client.get(url).json()
+        self.assertEqual(payload["categories"][0]["songs"][0]["title"], "Renamed Song")
+        self.assertEqual(payload["categories"][1]["songs"], [])
+
+    def test_writes_without_signals_are_noticed(self):
+        # As from another worker or a management command container, whose cache
+        # invalidation never reaches this process.
+        self.client.force_authenticate(user=self.user)
+        url = reverse("songbook-detail")
+        first = self.client.get(url)
+
+        Song.objects.filter(pk=self.alpha_song.pk).update(title="Updated elsewhere", version=ContentVersion.reserve())
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["categories"][0]["songs"][0]["title"], "Updated elsewhere")
+
+    def test_songbook_endpoint_honours_if_none_match(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse("songbook-detail")
+        first = self.client.get(url)
+        self.assertTrue(first.has_header("ETag"))
+        self.assertTrue(first.has_header("Last-Modified"))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], first["ETag"])
+
+    def test_songbook_endpoint_honours_if_modified_since(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse("songbook-detail")
+        first = self.client.get(url)
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_songbook_etag_changes_after_edit(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse("songbook-detail")
+        first = self.client.get(url)
+
+        self.beta_song.title = "Beta Song (revised)"
+        self.beta_song.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], first["ETag"])
+
+
+class SongbookFragmentTests(TestCase):
+    def setUp(self):
+        self.songbook = SongBook.objects.create(name="Fragments")
+        self.category = Category.objects.create(name="Visor", songbook=self.songbook, order=20)
+        self.empty = Category.objects.create(name="Tom", songbook=self.songbook, order=10)
+        self.song = Song.objects.create(title="Helan\u2028går", category=self.category, content="<p>Å ä ö</p>")
+        Song.objects.create(title="Halvan", category=self.category)
+
+    def reference_payload(self):
+        data = SongBookSerializer(songbook_queryset().get(pk=self.songbook.pk)).data
+        data["version"] = ContentVersion.current()
+        return JSONRenderer().render(data)
+
+    def test_assembled_payload_matches_serializer_output(self):
+        self.assertEqual(build_songbook_snapshot(self.songbook.pk), self.reference_payload())
+        # Assembled from cached fragments the second time.
+        self.assertEqual(build_songbook_snapshot(self.songbook.pk), self.reference_payload())
+
+    def test_edit_reserializes_only_the_changed_song(self):
+        build_songbook_snapshot(self.songbook.pk)
+        self.song.title = "Helan går"
+        self.song.save()
+
+        with mock.patch("api.snapshot.song_representations", wraps=song_representations) as representations:
+            payload = build_songbook_snapshot(self.songbook.pk)
+
+        self.assertEqual([song.pk for song in representations.call_args.args[0]], [self.song.pk])
+        self.assertEqual(payload, self.reference_payload())
+
+    def test_category_rename_refreshes_its_songs(self):
+        build_songbook_snapshot(self.songbook.pk)
+        self.category.name = "Snapsvisor"
+        self.category.save()
+
+        payload = json.loads(build_songbook_snapshot(self.songbook.pk))
+
+        self.assertEqual({song["category_name"] for song in payload["categories"][1]["songs"]}, {"Snapsvisor"})
+
+
+class FastReadPathTests(TestCase):
+    def setUp(self):
+        self.songbook = SongBook.objects.create(name="Snabb")
+        self.category = Category.objects.create(name="Visor", songbook=self.songbook)
+        self.song = Song.objects.create(
+            title="Helan\u2028går",
+            melody="Trad.",
+            content="<p>Å ä ö \u2029 \U0001f37a</p>",
+            category=self.category,
+            page_number=4,
+            negative_page_number=-4,
+            audio="songs/audio/helan.mp3",
+        )
+
+    def test_song_representation_matches_serializer(self):
+        songs = Song.objects.filter(pk=self.song.pk)
+        [(song_id, representation)] = song_representations(songs, {self.category.pk: self.category.name})
+
+        expected = SongSerializer(self.song).data
+        self.assertEqual(song_id, self.song.pk)
+        self.assertEqual(list(representation), list(expected))
+        self.assertEqual(render_json(representation), JSONRenderer().render(expected))
+
+    def test_category_header_matches_serializer(self):
+        [row] = category_rows(self.songbook.pk)
+        expected = CategorySerializer(self.category).data
+        del expected["songs"]
+
+        self.assertEqual(render_json(category_header(row)), JSONRenderer().render(expected))
+
+    def test_renderer_output_matches_json_renderer(self):
+        data = {
+            "list": [SongSerializer(self.song).data, None, True, 1.5, -3],
+            "version": self.songbook.version,
+            "text": "\u2028\u2029 \" \\ / \x00 ☃",
+        }
+
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_renderer_falls_back_without_orjson(self):
+        data = SongSerializer(self.song).data
+
+        with mock.patch("api.renderers.orjson", None):
+            self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_indented_output_uses_json_renderer(self):
+        data = {"title": self.song.title}
+        context = {"indent": 2}
+
+        self.assertEqual(
+            FastJSONRenderer().render(data, renderer_context=context),
+            JSONRenderer().render(data, renderer_context=context),
+        )
+
+
+class MessagePackTests(ClearCacheMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(username="msgpack-user", password="password123")
+        self.songbook = SongBook.objects.create(name="Festival")
+        self.category = Category.objects.create(name="Visor", songbook=self.songbook)
+        self.songs = [
+            Song.objects.create(title=title, melody="Trad.", category=self.category, order=order)
+            for order, title in enumerate(["Helan går", "Halvan"])
+        ]
+        self.client.force_authenticate(user=self.user)
+
+    def get(self, url, accept="application/msgpack", **headers):
+        return self.client.get(url, HTTP_ACCEPT=accept, **headers)
+
+    def test_songbook_in_columnar_layout(self):
+        url = reverse("songbook-detail")
+        expected = self.client.get(url).json()
+
+        response = self.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        self.assertIn("Accept", response["Vary"])
+        payload = msgpack.unpackb(response.content)
+        self.assertEqual(payload, to_columns(expected))
+        songs = payload["categories"][0]["songs"]
+        self.assertEqual(songs["columns"], list(SongSerializer().fields))
+        self.assertEqual([row[songs["columns"].index("title")] for row in songs["rows"]], ["Helan går", "Halvan"])
+
+    def test_songbook_rows_layout_matches_json(self):
+        url = reverse("songbook-detail")
+
+        response = self.get(url, accept="application/msgpack; layout=rows")
+
+        self.assertEqual(msgpack.unpackb(response.content), self.client.get(url).json())
+
+    def test_each_representation_has_its_own_etag(self):
+        url = reverse("songbook-detail")
+        json_response = self.client.get(url)
+        columns = self.get(url)
+        rows = self.get(url, accept="application/msgpack; layout=rows")
+
+        self.assertEqual(len({json_response["ETag"], columns["ETag"], rows["ETag"]}), 3)
+        self.assertEqual(self.get(url, HTTP_IF_NONE_MATCH=columns["ETag"]).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(self.get(url, HTTP_IF_NONE_MATCH=json_response["ETag"]).status_code, status.HTTP_200_OK)
+
+    def test_song_list_and_detail(self):
+        page = msgpack.unpackb(self.get(reverse("songs-list")).content)
+        song = msgpack.unpackb(self.get(reverse("songs-detail", kwargs={"pk": self.songs[1].pk})).content)
+
+        self.assertEqual(page["results"]["columns"], list(SongSerializer().fields))
+        self.assertEqual(len(page["results"]["rows"]), 2)
+        self.assertEqual(song["title"], "Halvan")
+
+    def test_format_query_parameter(self):
+        response = self.client.get(reverse("songs-list"), {"format": "msgpack"})
+
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+
+    def test_errors_are_encoded_too(self):
+        response = self.get(reverse("songbooks-detail", kwargs={"songbook": "missing"}))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(msgpack.unpackb(response.content), {"detail": "Songbook not found."})
+
+
+class SongBookChangesAPITests(ClearCacheMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(username="sync-user", password="password123")
+        self.songbook = SongBook.objects.create(name="Offline Book")
+        self.category = Category.objects.create(name="Drinking Songs", songbook=self.songbook)
+        self.kept_song = Song.objects.create(title="Helan går", category=self.category)
+        self.edited_song = Song.objects.create(title="Nu tar vi den", category=self.category)
+        self.removed_song = Song.objects.create(title="Imbelupet", category=self.category)
+        self.client.force_authenticate(user=self.user)
+
+    def test_versions_increase_on_every_save(self):
+        version = self.edited_song.version
+        self.edited_song.save()
+
+        self.assertGreater(self.edited_song.version, version)
+        self.assertEqual(ContentVersion.current(), self.edited_song.version)
+
+    def test_snapshot_reports_current_version(self):
+        payload = self.client.get(reverse("songbook-detail")).json()
+
+        self.assertEqual(payload["version"], ContentVersion.current())
+
+    def test_returns_only_changes_since_version(self):
+        since = ContentVersion.current()
+        self.edited_song.content = "<p>New verse</p>"
+        self.edited_song.save()
+        removed_id = self.removed_song.id
+        self.removed_song.delete()
+
+        response = self.client.get(reverse("songbook-changes"), {"since": since})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["version"], ContentVersion.current())
+        self.assertIsNone(response.data["songbook"])
+        self.assertEqual(response.data["categories"], [])
+        self.assertEqual([song["id"] for song in response.data["songs"]], [self.edited_song.id])
+        self.assertEqual(response.data["deleted"], {"categories": [], "songs": [removed_id]})
+
+    def test_category_delete_records_cascaded_tombstones(self):
+        since = ContentVersion.current()
+        category_id = self.category.id
+        song_ids = sorted([self.kept_song.id, self.edited_song.id, self.removed_song.id])
+        self.category.delete()
+
+        response = self.client.get(reverse("songbook-changes"), {"since": since})
+
+        self.assertEqual(response.data["deleted"]["categories"], [category_id])
+        self.assertEqual(sorted(response.data["deleted"]["songs"]), song_ids)
+
+    def test_cascaded_deletes_write_tombstones_in_bulk(self):
+        for index in range(5):
+            Song.objects.create(title=f"Extra {index}", category=self.category)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.category.delete()
+
+        statements = [query["sql"] for query in queries.captured_queries]
+        self.assertEqual(sum('INSERT INTO "api_tombstone"' in sql for sql in statements), 1)
+        self.assertEqual(sum('INSERT INTO "api_contentversion"' in sql for sql in statements), 1)
+        tombstones = Tombstone.objects.filter(songbook_id=self.songbook.id)
+        self.assertEqual(tombstones.filter(kind=Tombstone.SONG).count(), 8)
+        self.assertEqual(len(set(tombstones.values_list("version", flat=True))), 1)
+
+    def test_songbook_delete_records_every_tombstone_once(self):
+        songbook_id = self.songbook.id
+        self.songbook.delete()
+
+        kinds = sorted(Tombstone.objects.filter(songbook_id=songbook_id).values_list("kind", flat=True))
+        self.assertEqual(kinds, [Tombstone.CATEGORY, *[Tombstone.SONG] * 3, Tombstone.SONGBOOK])
+
+    def test_no_changes_returns_empty_delta(self):
+        response = self.client.get(reverse("songbook-changes"), {"since": ContentVersion.current()})
+
+        self.assertEqual(response.data["songs"], [])
+        self.assertEqual(response.data["deleted"], {"categories": [], "songs": []})
+
+    def test_requires_integer_since(self):
+        response = self.client.get(reverse("songbook-changes"), {"since": "yesterday"})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class MultiSongbookAPITests(ClearCacheMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(username="library-user", password="password123")
+        self.student_book = SongBook.objects.create(name="Studentsånger")
+        self.hymn_book = SongBook.objects.create(name="Psalms", slug="psalmer")
+        self.student_song = Song.objects.create(
+            title="Gaudeamus", category=Category.objects.create(name="Latin", songbook=self.student_book)
+        )
+        self.hymn_song = Song.objects.create(
+            title="Härlig är jorden", category=Category.objects.create(name="Advent", songbook=self.hymn_book)
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_slug_is_derived_from_name(self):
+        self.assertEqual(self.student_book.slug, "studentsanger")
+
+    def test_slugs_of_similar_names_are_made_unique(self):
+        plain = SongBook.objects.create(name="Studentsanger")
+        slashed = SongBook.objects.create(name="Student/sånger")
+        punctuation = SongBook.objects.create(name="!!!")
+        more_punctuation = SongBook.objects.create(name="???")
+
+        self.assertEqual(plain.slug, "studentsanger-2")
+        self.assertEqual(slashed.slug, "studentsanger-3")
+        self.assertEqual(punctuation.slug, "songbook")
+        self.assertEqual(more_punctuation.slug, "songbook-2")
+
+    def test_lists_songbooks(self):
+        response = self.client.get(reverse("songbooks-list"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data,
+            [
+                {"id": self.hymn_book.id, "name": "Psalms", "slug": "psalmer"},
+                {"id": self.student_book.id, "name": "Studentsånger", "slug": "studentsanger"},
+            ],
+        )
+
+    def test_fetches_book_by_slug_or_id(self):
+        by_slug = self.client.get(reverse("songbooks-detail", args=["psalmer"]))
+        by_id = self.client.get(reverse("songbooks-detail", args=[self.student_book.id]))
+
+        self.assertEqual(by_slug.json()["id"], self.hymn_book.id)
+        self.assertEqual(by_id.json()["id"], self.student_book.id)
+        self.assertNotEqual(by_slug["ETag"], by_id["ETag"])
+
+    def test_unknown_book_returns_not_found(self):
+        response = self.client.get(reverse("songbooks-detail", args=["missing"]))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_book_created_elsewhere_is_found(self):
+        self.client.get(reverse("songbooks-list"))
+
+        SongBook.objects.bulk_create([SongBook(name="Nya visor", slug="nya-visor", version=ContentVersion.reserve())])
+        response = self.client.get(reverse("songbooks-detail", args=["nya-visor"]))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_edit_keeps_other_books_cached(self):
+        hymns_url = reverse("songbooks-detail", args=["psalmer"])
+        first = self.client.get(hymns_url)
+        self.client.get(reverse("songbooks-detail", args=["studentsanger"]))
+
+        self.student_song.title = "Gaudeamus igitur"
+        self.student_song.save()
+
+        # Content version, directory reload and the check that this book did not change.
+        with self.assertNumQueries(3):
+            response = self.client.get(hymns_url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        payload = self.client.get(reverse("songbooks-detail", args=["studentsanger"])).json()
+        self.assertEqual(payload["categories"][0]["songs"][0]["title"], "Gaudeamus igitur")
+
+    def test_rebuilt_book_keeps_its_etag_when_other_books_change(self):
+        hymns_url = reverse("songbooks-detail", args=["psalmer"])
+        first = self.client.get(hymns_url)
+
+        self.student_song.save()
+        cache.clear()
+        response = self.client.get(hymns_url, HTTP_IF_NONE_MATCH=first["ETag"])
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(first.json()["version"], self.hymn_song.version)
+
+    def test_changes_are_scoped_to_book(self):
+        since = ContentVersion.current()
+        self.student_song.save()
+        self.hymn_song.save()
+
+        response = self.client.get(reverse("songbooks-changes", args=["psalmer"]), {"since": since})
+
+        self.assertEqual([song["id"] for song in response.data["songs"]], [self.hymn_song.id])
+
+    def _book_song_ids(self, slug):
+        payload = self.client.get(reverse("songbooks-detail", args=[slug])).json()
+        return [song["id"] for category in payload["categories"] for song in category["songs"]]
+
+    def _changes(self, slug, since):
+        return self.client.get(reverse("songbooks-changes", args=[slug]), {"since": since}).data
+
+    def test_song_moved_to_another_book_leaves_the_old_one(self):
+        self.assertEqual(self._book_song_ids("studentsanger"), [self.student_song.id])
+        self.assertEqual(self._book_song_ids("psalmer"), [self.hymn_song.id])
+        since = ContentVersion.current()
+
+        self.student_song.category = self.hymn_song.category
+        self.student_song.save()
+
+        self.assertEqual(self._book_song_ids("studentsanger"), [])
+        self.assertCountEqual(self._book_song_ids("psalmer"), [self.hymn_song.id, self.student_song.id])
+        old_book, new_book = self._changes("studentsanger", since), self._changes("psalmer", since)
+        self.assertEqual(old_book["deleted"], {"categories": [], "songs": [self.student_song.id]})
+        self.assertEqual(old_book["songs"], [])
+        self.assertEqual([song["id"] for song in new_book["songs"]], [self.student_song.id])
+        self.assertEqual(new_book["deleted"], {"categories": [], "songs": []})
+
+    def test_song_moved_back_is_no_longer_reported_deleted(self):
+        since = ContentVersion.current()
+        home = self.student_song.category
+
+        self.student_song.category = self.hymn_song.category
+        self.student_song.save()
+        self.student_song.category = home
+        self.student_song.save()
+
+        changes = self._changes("studentsanger", since)
+        self.assertEqual([song["id"] for song in changes["songs"]], [self.student_song.id])
+        self.assertEqual(changes["deleted"], {"categories": [], "songs": []})
+
+    def test_category_moved_to_another_book_takes_its_songs_along(self):
+        self._book_song_ids("studentsanger")
+        since = ContentVersion.current()
+        category = self.student_song.category
+
+        category.songbook = self.hymn_book
+        category.save()
+
+        self.assertEqual(self._book_song_ids("studentsanger"), [])
+        self.assertCountEqual(self._book_song_ids("psalmer"), [self.student_song.id, self.hymn_song.id])
+        old_book, new_book = self._changes("studentsanger", since), self._changes("psalmer", since)
+        self.assertEqual(old_book["deleted"], {"categories": [category.id], "songs": [self.student_song.id]})
+        self.assertEqual([row["id"] for row in new_book["categories"]], [category.id])
+        self.assertEqual([song["id"] for song in new_book["songs"]], [self.student_song.id])
+
+    @override_settings(DEFAULT_SONGBOOK="psalmer")
+    def test_default_book_is_served_at_legacy_endpoint(self):
+        response = self.client.get(reverse("songbook-detail"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["id"], self.hymn_book.id)
+
+
+class SongSearchAPITests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="search-user", password="password123")
+        category = Category.objects.create(name="Snapsvisor", songbook=SongBook.objects.create(name="Search Book"))
+        self.lyric_match = Song.objects.create(
+            title="Sista visan",
+            category=category,
+            content="<p>Nu tar vi <strong>helan</strong> och sedan halvan</p>",
+        )
+        self.title_match = Song.objects.create(title="Helan går", melody="Traditionell", category=category)
+        self.unrelated = Song.objects.create(title="Rattens vals", category=category, content="<p>Ingen snaps</p>")
+        self.client.force_authenticate(user=self.user)
+
+    def test_ranks_title_matches_above_lyric_matches(self):
+        response = self.client.get(reverse("songs-search"), {"q": "helan"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([song["id"] for song in response.data], [self.title_match.id, self.lyric_match.id])
+        self.assertEqual(response.data[0]["category_name"], "Snapsvisor")
+
+    def test_matches_word_prefixes_and_highlights_lyrics(self):
+        response = self.client.get(reverse("songs-search"), {"q": "halv"})
+
+        self.assertEqual([song["id"] for song in response.data], [self.lyric_match.id])
+        self.assertIn("<mark>halvan</mark>", response.data[0]["snippet"])
+        self.assertNotIn("<strong>", response.data[0]["snippet"])
+
+    def test_requires_query(self):
+        response = self.client.get(reverse("songs-search"), {"q": "  "})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_admin_search_uses_full_text_index(self):
+        model_admin = admin.site._registry[Song]
+        queryset, may_have_duplicates = model_admin.get_search_results(None, Song.objects.all(), "trad")
+
+        self.assertFalse(may_have_duplicates)
+        self.assertIn("search_vector", str(queryset.query))
+        self.assertEqual(list(queryset), [self.title_match])
+
+
+class SongPageLookupAPITests(ClearCacheMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(username="page-user", password="password123")
+        self.songbook = SongBook.objects.create(name="Printed Book")
+        category = Category.objects.create(name="Visor", songbook=self.songbook)
+        self.front = Song.objects.create(title="Front", category=category, page_number=47)
+        self.shared = Song.objects.create(title="Shared", category=category, page_number=47, negative_page_number=-12)
+        self.later = Song.objects.create(title="Later", category=category, page_number=52)
+        self.client.force_authenticate(user=self.user)
+
+    def test_resolves_positive_and_flipped_pages(self):
+        front = self.client.get(reverse("songs-by-page", kwargs={"page": 47}))
+        flipped = self.client.get(reverse("songs-by-page", kwargs={"page": -12}))
+
+        self.assertEqual([song["title"] for song in front.data], ["Front", "Shared"])
+        self.assertEqual([song["title"] for song in flipped.data], ["Shared"])
+        self.assertEqual(
+            set(front.data[0]),
+            {"id", "title", "category", "category_name", "page_number", "negative_page_number"},
+        )
+
+    def test_resolves_page_ranges(self):
+        response = self.client.get(reverse("songs-by-page-range"), {"from": 40, "to": 50})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([song["title"] for song in response.data], ["Front", "Shared"])
+
+    def test_rejects_invalid_range(self):
+        response = self.client.get(reverse("songs-by-page-range"), {"from": "forty"})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_reports_page_collisions(self):
+        self.assertEqual(find_page_collisions(self.songbook), [(47, ["Front", "Shared"])])
+
+    def test_page_lookups_are_scoped_to_one_book(self):
+        other = SongBook.objects.create(name="Other Book")
+        category = Category.objects.create(name="Visor", songbook=other)
+        Song.objects.create(title="Elsewhere", category=category, page_number=47)
+
+        ambiguous = self.client.get(reverse("songs-by-page", kwargs={"page": 47}))
+        by_slug = self.client.get(reverse("songs-by-page", kwargs={"page": 47}), {"songbook": self.songbook.slug})
+        by_id = self.client.get(reverse("songs-by-page-range"), {"from": 40, "to": 50, "songbook": other.id})
+        missing = self.client.get(reverse("songs-by-page-range"), {"from": 40, "songbook": "missing"})
+
+        self.assertEqual(ambiguous.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual([song["title"] for song in by_slug.data], ["Front", "Shared"])
+        self.assertEqual([song["title"] for song in by_id.data], ["Elsewhere"])
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+
 
 class SongViewSetTests(APITestCase):
     def setUp(self):
@@ -145,5 +1067,248 @@ class SongViewSetTests(APITestCase):
         response = self.client.get(url)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data[0]["id"], self.song.id)
-        self.assertEqual(response.data[0]["category_name"], self.category.name)
+        self.assertEqual(response.data["results"][0]["id"], self.song.id)
+        self.assertEqual(response.data["results"][0]["category_name"], self.category.name)
+
+    def test_song_list_pages_with_keyset_cursor(self):
+        for index in range(4):
+            Song.objects.create(title=f"Extra {index}", category=self.category)
+        self.client.force_authenticate(user=self.user)
+
+        titles = []
+        url = reverse("songs-list") + "?page_size=2"
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            titles.extend(song["title"] for song in response.data["results"])
+            url = response.data["next"]
+
+        self.assertEqual(titles, ["Shared Tune", "Extra 0", "Extra 1", "Extra 2", "Extra 3"])
+
+    def test_song_list_pages_past_songs_without_order(self):
+        extras = [Song.objects.create(title=f"Extra {index}", category=self.category) for index in range(4)]
+        Song.objects.filter(pk__in=[extras[0].pk, extras[1].pk]).update(order=None)
+        self.client.force_authenticate(user=self.user)
+
+        titles = []
+        url = reverse("songs-list") + "?page_size=2"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            titles.extend(song["title"] for song in response.data["results"])
+            url = response.data["next"]
+
+        self.assertEqual(titles, ["Shared Tune", "Extra 2", "Extra 3", "Extra 0", "Extra 1"])
+
+    def test_song_list_rejects_malformed_cursor(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse("songs-list"), {"cursor": "not-a-cursor"})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_sparse_fieldset_limits_output_and_columns(self):
+        self.client.force_authenticate(user=self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("songs-list"), {"fields": "id,title,category_name"})
+
+        self.assertEqual(
+            response.data["results"],
+            [{"id": self.song.id, "title": "Shared Tune", "category_name": "Favorites"}],
+        )
+        self.assertNotIn('"content"', queries.captured_queries[0]["sql"])
+
+    def test_sparse_fieldset_rejects_unknown_fields(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse("songs-list"), {"fields": "title,password"})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AsyncReadViewTests(ClearCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(username="async-user", password="password123")
+        self.songbook = SongBook.objects.create(name="Async Book")
+        self.category = Category.objects.create(name="Marches", songbook=self.songbook)
+        self.songs = [Song.objects.create(title=f"March {index}", category=self.category) for index in range(3)]
+        self.factory = APIRequestFactory()
+
+    def call(self, view, method="get", path="/", data=None, **kwargs):
+        request = getattr(self.factory, method)(path, data, format="json")
+        force_authenticate(request, user=self.user)
+        response = async_to_sync(view)(request, **kwargs)
+        return response.render() if hasattr(response, "render") else response
+
+    def test_songbook_matches_sync_snapshot(self):
+        view = AsyncSongBookDetailView.as_view()
+
+        response = self.call(view, songbook=self.songbook.slug)
+        cached = self.call(view, songbook=self.songbook.slug)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, get_songbook_snapshot(self.songbook.id)["payload"])
+        self.assertEqual(cached["ETag"], response["ETag"])
+
+    def test_songbook_as_msgpack(self):
+        view = AsyncSongBookDetailView.as_view()
+        request = self.factory.get("/", HTTP_ACCEPT="application/msgpack")
+        force_authenticate(request, user=self.user)
+
+        response = async_to_sync(view)(request, songbook=self.songbook.slug)
+
+        payload = json.loads(get_songbook_snapshot(self.songbook.id)["payload"])
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        self.assertEqual(msgpack.unpackb(response.content), to_columns(payload))
+
+    def test_list_and_retrieve(self):
+        list_view = AsyncSongViewSet.as_view({"get": "list"})
+        detail_view = AsyncSongViewSet.as_view({"get": "retrieve", "patch": "partial_update"})
+
+        page = self.call(list_view, path="/?page_size=2")
+        song = self.call(detail_view, pk=self.songs[1].id)
+        missing = self.call(detail_view, pk=0)
+
+        self.assertEqual([row["title"] for row in page.data["results"]], ["March 0", "March 1"])
+        self.assertIsNotNone(page.data["next"])
+        self.assertEqual(song.data["title"], "March 1")
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_write_actions_still_work(self):
+        view = AsyncSongViewSet.as_view({"patch": "partial_update"})
+
+        response = self.call(view, method="patch", data={"title": "Renamed"}, pk=self.songs[0].id)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.songs[0].refresh_from_db()
+        self.assertEqual(self.songs[0].title, "Renamed")
+
+
+class PooledDatabaseBackendTests(SimpleTestCase):
+    def wrapper(self, **pool):
+        settings_dict = {**connection.settings_dict, "ENGINE": "albins2.db", "POOL": {"timeout": 0.1, **pool}}
+        wrapper = PooledDatabaseWrapper(settings_dict, alias=self.id())
+        self.addCleanup(lambda: wrapper.pool.close_idle())
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def test_reuses_returned_connection(self):
+        wrapper = self.wrapper(max_size=2)
+        wrapper.ensure_connection()
+        raw_connection = wrapper.connection
+        wrapper.close()
+
+        wrapper.ensure_connection()
+        with wrapper.cursor() as cursor:
+            cursor.execute("SELECT 1")
+
+        self.assertIs(wrapper.connection, raw_connection)
+        stats = wrapper.pool.stats()
+        self.assertEqual((stats["connects"], stats["in_use"], stats["idle"]), (1, 1, 0))
+
+    def test_waits_for_free_connection_then_times_out(self):
+        first = self.wrapper(max_size=1)
+        first.ensure_connection()
+        second = PooledDatabaseWrapper(first.settings_dict, alias=first.alias)
+
+        with self.assertRaises(OperationalError):
+            second.ensure_connection()
+
+        stats = first.pool.stats()
+        self.assertEqual((stats["waits"], stats["timeouts"]), (1, 1))
+
+    def test_discards_broken_connection(self):
+        wrapper = self.wrapper(max_size=1)
+        wrapper.ensure_connection()
+        wrapper.connection.close()
+        wrapper.close()
+
+        stats = wrapper.pool.stats()
+        self.assertEqual((stats["size"], stats["errors"]), (0, 1))
+
+
+@override_settings(REQUEST_TIMING=True)
+class RequestTimingMiddlewareTests(APITestCase):
+    def setUp(self):
+        reset_timing_summary()
+        songbook = SongBook.objects.create(name="Albins")
+        category = Category.objects.create(name="Snapsvisor", songbook=songbook)
+        self.song = Song.objects.create(title="Helan går", category=category, content="<p>Helan går</p>")
+        self.user = get_user_model().objects.create_user(username="reader", password="pw")
+
+    def test_reports_phases_in_server_timing_and_log(self):
+        self.client.force_authenticate(self.user)
+
+        with self.assertLogs("albins2.timing", level="INFO") as logs:
+            response = self.client.get(reverse("songs-detail", args=[self.song.pk]))
+
+        phases = [entry.split(";")[0] for entry in response["Server-Timing"].split(", ")]
+        self.assertEqual(phases, ["db", "auth", "view", "render", "total"])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["url_name"], "songs-detail")
+        self.assertEqual(record["status"], 200)
+        self.assertGreaterEqual(record["db_queries"], 1)
+        self.assertIn(f'desc="{record["db_queries"]} queries"', response["Server-Timing"])
+
+    def test_aggregates_per_url_name(self):
+        self.client.force_authenticate(self.user)
+
+        with self.assertLogs("albins2.timing", level="INFO"):
+            for _ in range(2):
+                self.client.get(reverse("songs-list"))
+            self.client.get(reverse("songbook-detail"))
+
+        summary = timing_summary()
+        self.assertEqual(summary["songs-list"]["requests"], 2)
+        self.assertEqual(summary["songbook-detail"]["requests"], 1)
+        self.assertIn("db_queries", summary["songs-list"]["averages"])
+
+    @override_settings(REQUEST_TIMING=False)
+    def test_disabled_by_default(self):
+        self.client.force_authenticate(self.user)
+
+        response = self.client.get(reverse("songs-list"))
+
+        self.assertNotIn("Server-Timing", response)
+
+
+class MetricsEndpointTests(APITestCase):
+    def setUp(self):
+        songbook = SongBook.objects.create(name="Albins")
+        category = Category.objects.create(name="Snapsvisor", songbook=songbook)
+        self.song = Song.objects.create(title="Helan går", category=category, content="<p>Helan går</p>")
+        self.client.force_authenticate(get_user_model().objects.create_user(username="reader", password="pw"))
+
+    @staticmethod
+    def metric(name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_counts_requests_latency_and_queries_per_url_name(self):
+        labels = {"view": "songs-detail", "method": "GET"}
+        requests = self.metric("albins_http_requests_total", status="200", **labels)
+        observed = self.metric("albins_http_request_duration_seconds_count", **labels)
+        queries = self.metric("albins_db_queries_total", view="songs-detail")
+
+        self.client.get(reverse("songs-detail", args=[self.song.pk]))
+
+        self.assertEqual(self.metric("albins_http_requests_total", status="200", **labels), requests + 1)
+        self.assertEqual(self.metric("albins_http_request_duration_seconds_count", **labels), observed + 1)
+        self.assertGreater(self.metric("albins_db_queries_total", view="songs-detail"), queries)
+
+    def test_counts_snapshot_cache_hits(self):
+        hits = self.metric("albins_cache_lookups_total", cache="songbook_snapshot", result="hit")
+
+        self.client.get(reverse("songbook-detail"))
+        self.client.get(reverse("songbook-detail"))
+
+        self.assertEqual(self.metric("albins_cache_lookups_total", cache="songbook_snapshot", result="hit"), hits + 1)
+
+    def test_exposes_prometheus_text_without_authentication(self):
+        self.client.force_authenticate(None)
+
+        response = self.client.get(reverse("metrics"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        self.assertIn(b"# TYPE albins_http_request_duration_seconds histogram", response.content)
+        self.assertIn(b"albins_throttle_denials_total", response.content)
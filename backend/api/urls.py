@@ -1,12 +1,36 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .viewsets import SongViewSet
-from .views import SongBookDetailView
+
+from albins2.metrics import metrics_view
+
+from .viewsets import AsyncSongViewSet, SongViewSet
+from .views import (
+    AsyncSongBookDetailView,
+    DatabasePoolView,
+    RequestTimingView,
+    SongBookChangesView,
+    SongBookDetailView,
+    SongBookListView,
+)
+
+# ASGI deployments serve the read endpoints from the event loop.
+if settings.ASYNC_READ_VIEWS:
+    song_viewset, songbook_detail_view = AsyncSongViewSet, AsyncSongBookDetailView
+else:
+    song_viewset, songbook_detail_view = SongViewSet, SongBookDetailView
 
 router = DefaultRouter()
-router.register(r"songs", SongViewSet, basename="songs")
+router.register(r"songs", song_viewset, basename="songs")
 
 urlpatterns = [
-    path("songbook/", SongBookDetailView.as_view(), name="songbook-detail"),
+    path("songbook/", songbook_detail_view.as_view(), name="songbook-detail"),
+    path("songbook/changes", SongBookChangesView.as_view(), name="songbook-changes"),
+    path("songbooks/", SongBookListView.as_view(), name="songbooks-list"),
+    path("songbooks/<str:songbook>/", songbook_detail_view.as_view(), name="songbooks-detail"),
+    path("songbooks/<str:songbook>/changes", SongBookChangesView.as_view(), name="songbooks-changes"),
+    path("db-pool/", DatabasePoolView.as_view(), name="db-pool"),
+    path("metrics", metrics_view, name="metrics"),
+    path("request-timings/", RequestTimingView.as_view(), name="request-timings"),
     path("", include(router.urls)),
 ]
@@ -1,34 +1,173 @@
-from django.db.models import Prefetch
+from functools import partial
+
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
 from rest_framework import permissions, status
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 
-from .models import Category, Song, SongBook
-from .serializers import SongBookSerializer
+from albins2.db.pool import pool_stats
+from albins2.timing import timing_summary
 
+from .async_dispatch import AsyncDispatchMixin
+from .models import Category, ContentVersion, Song, SongBook, Tombstone
+from .renderers import MSGPACK_RENDERER_CLASSES, MessagePackRenderer
+from .serializers import CategorySummarySerializer, SongSerializer
+from .snapshot import (
+    aget_snapshot_variant,
+    aget_songbook_snapshot,
+    aresolve_songbook_id,
+    get_snapshot_variant,
+    get_songbook_directory,
+    get_songbook_snapshot,
+    resolve_songbook_id,
+)
+
+
+def songbook_lookup_error(exc):
+    if isinstance(exc, SongBook.MultipleObjectsReturned):
+        return Response(
+            {"detail": "Multiple songbooks found. Please ensure only one songbook exists."},
+            status=status.HTTP_409_CONFLICT,
+        )
+    return Response({"detail": "Songbook not found."}, status=status.HTTP_404_NOT_FOUND)
 
-class SongBookDetailView(APIView):
-    permission_classes = [permissions.IsAuthenticated]
 
+class SongBookListView(APIView):
     def get(self, request):
-        queryset = SongBook.objects.prefetch_related(
-            Prefetch(
-                "categories",
-                queryset=Category.objects.order_by("order", "id").prefetch_related(
-                    Prefetch("songs", queryset=Song.objects.order_by("order", "id"))
-                ),
-            )
+        return Response(get_songbook_directory(), status=status.HTTP_200_OK)
+
+
+class SongBookDetailView(APIView):
+    """
+    Serve one songbook, picked by id or slug, or the default book when none is given.
+
+    Every book has its own cached snapshot and ETag, so editing one book does
+    not make clients of the others download theirs again. Clients that send
+    ``Accept: application/msgpack`` get the book as MessagePack instead.
+    """
+
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, *MSGPACK_RENDERER_CLASSES]
+    # Anonymous reads skip the shared throttle counter; see TokenRateThrottle.
+    serves_cached_content = True
+
+    def get(self, request, songbook=None):
+        # One read of the content version validates both the directory and the book.
+        version = ContentVersion.current()
+        try:
+            snapshot = get_songbook_snapshot(resolve_songbook_id(songbook, version), version)
+        except (SongBook.DoesNotExist, SongBook.MultipleObjectsReturned) as exc:
+            return songbook_lookup_error(exc)
+        variant = self.snapshot_variant(request)
+        if variant is not None:
+            snapshot = get_snapshot_variant(snapshot, *variant)
+        return self.snapshot_response(request, snapshot)
+
+    def snapshot_variant(self, request):
+        """``(variant name, encode)`` when the client accepted MessagePack, otherwise None for the JSON payload."""
+        renderer = request.accepted_renderer
+        if not isinstance(renderer, MessagePackRenderer):
+            return None
+        layout = renderer.get_layout(request.accepted_media_type)
+        return f"msgpack-{layout}", partial(renderer.encode, layout=layout)
+
+    def snapshot_response(self, request, snapshot):
+        response = get_conditional_response(
+            request,
+            etag=snapshot["etag"],
+            last_modified=snapshot["last_modified"],
         )
+        if response is None:
+            renderer = request.accepted_renderer
+            content_type = renderer.media_type if isinstance(renderer, MessagePackRenderer) else "application/json"
+            response = HttpResponse(snapshot["payload"], content_type=content_type, status=status.HTTP_200_OK)
+
+        patch_vary_headers(response, ["Accept"])
+        response["ETag"] = snapshot["etag"]
+        response["Last-Modified"] = http_date(snapshot["last_modified"])
+        # Clients keep the book offline but must revalidate before reusing it.
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
+
+class AsyncSongBookDetailView(AsyncDispatchMixin, SongBookDetailView):
+    """SongBookDetailView for ASGI workers, running on the event loop."""
+
+    async def get(self, request, songbook=None):
+        version = await ContentVersion.acurrent()
+        try:
+            snapshot = await aget_songbook_snapshot(await aresolve_songbook_id(songbook, version), version)
+        except (SongBook.DoesNotExist, SongBook.MultipleObjectsReturned) as exc:
+            return songbook_lookup_error(exc)
+        variant = self.snapshot_variant(request)
+        if variant is not None:
+            snapshot = await aget_snapshot_variant(snapshot, *variant)
+        return self.snapshot_response(request, snapshot)
+
 
+class SongBookChangesView(APIView):
+    def get(self, request, songbook=None):
         try:
-            songbook = queryset.get()
-        except SongBook.DoesNotExist:
-            return Response({"detail": "Songbook not found."}, status=status.HTTP_404_NOT_FOUND)
-        except SongBook.MultipleObjectsReturned:
+            since = int(request.query_params["since"])
+        except (KeyError, ValueError):
             return Response(
-                {"detail": "Multiple songbooks found. Please ensure only one songbook exists."},
-                status=status.HTTP_409_CONFLICT,
+                {"detail": "Query parameter 'since' must be an integer version."},
+                status=status.HTTP_400_BAD_REQUEST,
             )
 
-        serializer = SongBookSerializer(songbook)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        # Cap the window at the version read up front so a write committing
+        # mid-request is reported by the next sync instead of being skipped.
+        version = ContentVersion.current()
+
+        try:
+            songbook = SongBook.objects.get(pk=resolve_songbook_id(songbook))
+        except (SongBook.DoesNotExist, SongBook.MultipleObjectsReturned) as exc:
+            return songbook_lookup_error(exc)
+
+        window = {"version__gt": since, "version__lte": version}
+        categories = Category.objects.filter(songbook=songbook, **window).order_by("order", "id")
+        songs = (
+            Song.objects.select_related("category")
+            .filter(category__songbook=songbook, **window)
+            .order_by("order", "id")
+        )
+        tombstones = Tombstone.objects.filter(songbook_id=songbook.id, **window).values_list("kind", "object_id")
+
+        deleted = {"categories": [], "songs": []}
+        for kind, object_id in tombstones:
+            if kind == Tombstone.CATEGORY:
+                deleted["categories"].append(object_id)
+            elif kind == Tombstone.SONG:
+                deleted["songs"].append(object_id)
+
+        changed_book = since < songbook.version <= version
+        return Response(
+            {
+                "version": version,
+                "songbook": {"id": songbook.id, "name": songbook.name} if changed_book else None,
+                "categories": CategorySummarySerializer(categories, many=True).data,
+                "songs": SongSerializer(songs, many=True).data,
+                "deleted": deleted,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class DatabasePoolView(APIView):
+    """Connection pool statistics of the worker process answering the request."""
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response({"pools": pool_stats()}, status=status.HTTP_200_OK)
+
+
+class RequestTimingView(APIView):
+    """Request timings per URL name collected by RequestTimingMiddleware in this worker process."""
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(timing_summary(), status=status.HTTP_200_OK)
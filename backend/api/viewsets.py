@@ -1,10 +1,128 @@
-from rest_framework import permissions, viewsets
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import Http404
+from django.utils.functional import cached_property
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
-from .models import Song
-from .serializers import SongSerializer
+from .async_dispatch import AsyncDispatchMixin
+from .models import Song, SongBook
+from .pages import PAGE_RESULT_LIMIT, songs_in_page_range, songs_on_page
+from .pagination import OrderKeysetPagination
+from .renderers import MSGPACK_RENDERER_CLASSES
+from .search import SEARCH_RESULT_LIMIT, search_songs
+from .serializers import SongPageSerializer, SongSearchResultSerializer, SongSerializer
+from .snapshot import resolve_songbook_id
+from .views import songbook_lookup_error
+
+# Serializer fields that are not plain model fields, mapped to the columns they read.
+SPARSE_FIELD_SOURCES = {"category_name": "category__name"}
 
 
 class SongViewSet(viewsets.ModelViewSet):
-    queryset = Song.objects.select_related("category")
+    queryset = Song.objects.select_related("category").defer("search_vector")
     serializer_class = SongSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = OrderKeysetPagination
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, *MSGPACK_RENDERER_CLASSES]
+
+    @cached_property
+    def sparse_fields(self):
+        """Field names requested through ``?fields=`` on list/retrieve, or None for all fields."""
+        raw = self.request.query_params.get("fields")
+        if self.action not in ("list", "retrieve") or not raw:
+            return None
+
+        fields = [name.strip() for name in raw.split(",") if name.strip()]
+        unknown = sorted(set(fields) - set(SongSerializer().fields))
+        if unknown:
+            raise ValidationError({"fields": [f"Unknown field: {name}" for name in unknown]})
+        return fields
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.sparse_fields
+        if fields is None:
+            return queryset
+
+        # Read only the columns the response needs; the keyset columns are always required.
+        columns = {"id", "order", *(SPARSE_FIELD_SOURCES.get(name, name) for name in fields)}
+        if "category__name" not in columns:
+            queryset = queryset.select_related(None)
+        return queryset.only(*columns)
+
+    def get_serializer(self, *args, **kwargs):
+        if self.sparse_fields is not None:
+            kwargs.setdefault("fields", self.sparse_fields)
+        return super().get_serializer(*args, **kwargs)
+
+    @action(detail=False, methods=["get"])
+    def search(self, request):
+        terms = request.query_params.get("q", "").strip()
+        if not terms:
+            return Response({"detail": "Query parameter 'q' is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = search_songs(terms, self.get_queryset())[:SEARCH_RESULT_LIMIT]
+        return Response(SongSearchResultSerializer(results, many=True).data)
+
+    def _page_queryset(self):
+        """
+        Songs of the book named by ``?songbook=`` (slug or id), or of the default book.
+
+        Page numbers are only unique within one printed book. Raises
+        SongBook.DoesNotExist, or SongBook.MultipleObjectsReturned when there
+        are several books, no default and no parameter.
+        """
+        songbook_id = resolve_songbook_id(self.request.query_params.get("songbook") or None)
+        return Song.objects.filter(category__songbook_id=songbook_id).select_related("category").only(
+            "id", "title", "category__name", "page_number", "negative_page_number", "order"
+        )
+
+    @action(detail=False, methods=["get"], url_path=r"by-page/(?P<page>-?\d+)")
+    def by_page(self, request, page):
+        try:
+            songs = self._page_queryset()
+        except (SongBook.DoesNotExist, SongBook.MultipleObjectsReturned) as exc:
+            return songbook_lookup_error(exc)
+
+        songs = songs_on_page(songs, int(page))[:PAGE_RESULT_LIMIT]
+        return Response(SongPageSerializer(songs, many=True).data)
+
+    @action(detail=False, methods=["get"], url_path="by-page", url_name="by-page-range")
+    def by_page_range(self, request):
+        try:
+            start = int(request.query_params["from"])
+            end = int(request.query_params.get("to", start))
+        except (KeyError, ValueError):
+            return Response(
+                {"detail": "Query parameters 'from' and 'to' must be page numbers."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            songs = self._page_queryset()
+        except (SongBook.DoesNotExist, SongBook.MultipleObjectsReturned) as exc:
+            return songbook_lookup_error(exc)
+
+        songs = songs_in_page_range(songs, start, end)[:PAGE_RESULT_LIMIT]
+        return Response(SongPageSerializer(songs, many=True).data)
+
+
+class AsyncSongViewSet(AsyncDispatchMixin, SongViewSet):
+    """SongViewSet for ASGI workers; list and retrieve use the async ORM, other actions run in a thread."""
+
+    async def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    async def retrieve(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            instance = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (Song.DoesNotExist, TypeError, ValueError, DjangoValidationError):
+            raise Http404
+        self.check_object_permissions(request, instance)
+        return Response(self.get_serializer(instance).data)
@@ -4,3 +4,5 @@ from django.apps import AppConfig
 class AuthConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'auth'
+    # "auth" is taken by django.contrib.auth.
+    label = 'token_auth'
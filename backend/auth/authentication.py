@@ -0,0 +1,202 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.auth.signals import user_logged_out
+from django.core import signing
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from knox.auth import TokenAuthentication
+from knox.crypto import hash_token
+from knox.models import AuthToken
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+
+from albins2.metrics import TOKENS_EXPIRED, record_cache_lookup
+from albins2.timing import measure
+
+READ_SCOPE = "read"
+SIGNING_SALT = "auth.anonymous-token"
+
+
+@dataclass(frozen=True)
+class SignedToken:
+    """A verified anonymous token; ``str()`` gives the raw token so throttles can key on it."""
+
+    key: str
+    scope: str
+    expiry: int
+
+    def __str__(self):
+        return self.key
+
+
+class AnonymousReader(AnonymousUser):
+    """Visitor authenticated by a signed token. Nothing about them is stored."""
+
+    @property
+    def username(self):
+        return settings.SERVICE_ACCOUNT_USERNAME
+
+    @property
+    def is_authenticated(self):
+        return True
+
+
+def issue_anonymous_token(scope=READ_SCOPE, lifetime=None):
+    """Return ``(token, expiry)`` for a new signed token; ``expiry`` is a Unix timestamp."""
+    expiry = int(time.time()) + (settings.TOKEN_EXPIRY if lifetime is None else lifetime)
+    token = signing.Signer(salt=SIGNING_SALT).sign_object({"scope": scope, "exp": expiry})
+    return token, expiry
+
+
+def verify_anonymous_token(token):
+    """Check the signature and expiry of ``token``; raises signing.BadSignature when invalid."""
+    claims = signing.Signer(salt=SIGNING_SALT).unsign_object(token)
+    if claims["exp"] <= time.time():
+        TOKENS_EXPIRED.labels(kind="anonymous").inc()
+        raise signing.BadSignature("Token has expired.")
+    return SignedToken(key=token, scope=claims["scope"], expiry=claims["exp"])
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    Authenticates the signed anonymous tokens handed out by the anonymous login.
+
+    They share the ``Token`` header with knox. Knox tokens are plain hex while
+    signed tokens always contain the ``:`` separator, so anything else is left
+    for the next authentication class. Verification is a single HMAC check and
+    never touches the database.
+    """
+
+    keyword = "Token"
+
+    @measure("auth")
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if len(auth) != 2 or auth[0].lower() != self.keyword.lower().encode():
+            return None
+
+        try:
+            token = auth[1].decode("ascii")
+        except UnicodeError:
+            return None
+        if ":" not in token:
+            return None
+
+        try:
+            signed_token = verify_anonymous_token(token)
+        except (signing.BadSignature, KeyError, TypeError):
+            raise exceptions.AuthenticationFailed("Invalid token.")
+        return AnonymousReader(), signed_token
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+class TokenCache:
+    """Thread-safe LRU of validated knox tokens keyed by digest, with a per-entry deadline."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+            return entry[1]
+
+    def set(self, digest, value, ttl):
+        with self._lock:
+            self._entries[digest] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def evict(self, digest):
+        with self._lock:
+            self._entries.pop(digest, None)
+
+    def evict_user(self, user_id):
+        with self._lock:
+            stale = [digest for digest, (_, (user, _)) in self._entries.items() if user.pk == user_id]
+            for digest in stale:
+                del self._entries[digest]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache(settings.AUTH_TOKEN_CACHE_SIZE)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Knox authentication that remembers validated tokens for AUTH_TOKEN_CACHE_TTL seconds.
+
+    A hit skips the token query and the user join entirely. Entries never
+    outlive the token's expiry and are evicted in this process when the token
+    is deleted or its user logs out; other workers drop theirs when the TTL
+    runs out, so keep it short. Setting the TTL to 0 disables the cache.
+    """
+
+    @measure("auth")
+    def authenticate(self, request):
+        return super().authenticate(request)
+
+    def authenticate_credentials(self, token):
+        ttl = settings.AUTH_TOKEN_CACHE_TTL
+        if ttl <= 0:
+            return super().authenticate_credentials(token)
+
+        try:
+            digest = hash_token(token.decode("utf-8"))
+        except (TypeError, ValueError):
+            raise exceptions.AuthenticationFailed("Invalid token.")
+
+        cached = token_cache.get(digest)
+        record_cache_lookup("auth_token", cached is not None)
+        if cached is not None:
+            return cached
+
+        user, auth_token = super().authenticate_credentials(token)
+        if auth_token.expiry is not None:
+            ttl = min(ttl, (auth_token.expiry - timezone.now()).total_seconds())
+        if ttl > 0:
+            token_cache.set(digest, (user, auth_token), ttl)
+        return user, auth_token
+
+    def _cleanup_token(self, auth_token):
+        # Knox deletes the user's expired tokens while authenticating. That is
+        # left to the purge_expired_tokens job; here expired tokens are only
+        # rejected, without the extra query or any writes.
+        if settings.TOKEN_CLEANUP_ON_REQUEST:
+            expired = super()._cleanup_token(auth_token)
+        else:
+            expired = auth_token.expiry is not None and auth_token.expiry < timezone.now()
+        if expired:
+            TOKENS_EXPIRED.labels(kind="knox").inc()
+        return expired
+
+
+@receiver(post_delete, sender=AuthToken)
+def evict_deleted_token(sender, instance, **kwargs):
+    token_cache.evict(instance.digest)
+
+
+@receiver(user_logged_out)
+def evict_logged_out_user(sender, user, **kwargs):
+    if user is not None:
+        token_cache.evict_user(user.pk)
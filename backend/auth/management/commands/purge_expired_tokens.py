@@ -0,0 +1,69 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from knox.models import AuthToken
+
+from auth.models import ThrottleWindow
+
+
+def purge_expired_tokens(batch_size=1000, pause=0.1, now=None):
+    """
+    Delete expired knox tokens ``batch_size`` rows at a time and return the count.
+
+    Each batch is its own short statement with ``pause`` seconds in between,
+    so the purge never holds locks on the token table for long.
+    """
+    now = now or timezone.now()
+    table = connection.ops.quote_name(AuthToken._meta.db_table)
+    pk = connection.ops.quote_name(AuthToken._meta.pk.column)
+
+    removed = 0
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {table} WHERE {pk} IN ("
+                f"SELECT {pk} FROM {table} WHERE expiry < %s LIMIT %s)",
+                [now, batch_size],
+            )
+            deleted = cursor.rowcount
+        removed += deleted
+        if deleted < batch_size:
+            return removed
+        time.sleep(pause)
+
+
+class Command(BaseCommand):
+    help = "Delete expired knox tokens and stale throttle counters in bounded batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Maximum number of tokens deleted per statement (default: 1000).",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.1,
+            help="Seconds to sleep between batches (default: 0.1).",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            help="Keep running and purge again every INTERVAL seconds.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            tokens = purge_expired_tokens(batch_size=options["batch_size"], pause=options["pause"])
+            counters = ThrottleWindow.purge_expired(int(time.time()))
+            self.stdout.write(
+                self.style.SUCCESS(f"Removed {tokens} expired tokens and {counters} throttle counters.")
+            )
+
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,28 @@
+# Generated by Django 5.0 on 2026-10-18 14:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThrottleWindow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=128)),
+                ('period', models.BigIntegerField()),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('expires', models.BigIntegerField(db_index=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='throttlewindow',
+            constraint=models.UniqueConstraint(fields=('key', 'period'), name='unique_throttle_period'),
+        ),
+    ]
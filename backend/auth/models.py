@@ -0,0 +1,51 @@
+from django.db import connection, models
+
+
+class ThrottleWindow(models.Model):
+    """Request count of one throttle key during one fixed period of the rate duration."""
+
+    key = models.CharField(max_length=128)
+    period = models.BigIntegerField()
+    hits = models.PositiveIntegerField(default=0)
+    # Unix time after which the row no longer affects any sliding window.
+    expires = models.BigIntegerField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["key", "period"], name="unique_throttle_period"),
+        ]
+
+    @classmethod
+    def hit(cls, key, period, expires):
+        """
+        Count one request in ``period`` and return the ``(current, previous)`` period counts.
+
+        A single statement, so every worker sharing the database sees the same
+        counts without read-modify-write races.
+        """
+        table = connection.ops.quote_name(cls._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"WITH hit AS ("
+                f"INSERT INTO {table} (key, period, hits, expires) VALUES (%s, %s, 1, %s) "
+                f"ON CONFLICT (key, period) DO UPDATE SET hits = {table}.hits + 1 "
+                "RETURNING hits) "
+                f"SELECT hit.hits, COALESCE((SELECT hits FROM {table} WHERE key = %s AND period = %s), 0) "
+                "FROM hit",
+                [key, period, expires, key, period - 1],
+            )
+            return cursor.fetchone()
+
+    @classmethod
+    def undo_hit(cls, key, period):
+        cls.objects.filter(key=key, period=period, hits__gt=0).update(hits=models.F("hits") - 1)
+
+    @classmethod
+    def counts(cls, key, period):
+        """Return the ``(current, previous)`` period counts without counting a request."""
+        hits = dict(cls.objects.filter(key=key, period__in=[period, period - 1]).values_list("period", "hits"))
+        return hits.get(period, 0), hits.get(period - 1, 0)
+
+    @classmethod
+    def purge_expired(cls, now):
+        return cls.objects.filter(expires__lt=now).delete()[0]
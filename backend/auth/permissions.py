@@ -0,0 +1,19 @@
+from rest_framework import permissions
+
+from .authentication import READ_SCOPE, SignedToken
+
+
+class TokenScopePermission(permissions.BasePermission):
+    """
+    Restrict requests made with a read-scoped signed token to safe methods.
+
+    Listed in DEFAULT_PERMISSION_CLASSES, so every view checks it unless it
+    sets its own permission_classes.
+    """
+
+    message = "This token only grants read access."
+
+    def has_permission(self, request, view):
+        if isinstance(request.auth, SignedToken) and request.auth.scope == READ_SCOPE:
+            return request.method in permissions.SAFE_METHODS
+        return True
@@ -1,60 +1,122 @@
+import io
 from datetime import datetime, timedelta
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import override_settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.management import call_command
 from django.urls import reverse
 from django.utils import timezone
 from knox.models import AuthToken
+from prometheus_client import REGISTRY
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from api.models import Category, Song, SongBook
+from api.testing import ClearCacheMixin
 
-class AnonymousTokenViewTests(APITestCase):
-    @override_settings(SERVICE_ACCOUNT_USERNAME="service_account", SERVICE_ACCOUNT_EMAIL="service@example.com")
-    def test_creates_service_account_and_returns_token(self):
-        url = reverse("knox_anonymous_login")
-        response = self.client.post(url)
+from .authentication import issue_anonymous_token, token_cache
+from .models import ThrottleWindow
+from .throttling import CachedReadRateThrottle, TokenRateThrottle
 
+
+def metric(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class AnonymousTokenViewTests(ClearCacheMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.songbook = SongBook.objects.create(name="Anonymous Book")
+        self.song = Song.objects.create(
+            title="Helan går", category=Category.objects.create(name="Snapsvisor", songbook=self.songbook)
+        )
+
+    def get_token(self):
+        response = self.client.post(reverse("knox_anonymous_login"))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertIn("token", response.data)
-        self.assertIn("expiry", response.data)
+        return response.data
+
+    def test_issues_signed_token_without_database_writes(self):
+        issued = metric("albins_tokens_issued_total", kind="anonymous")
+        with self.assertNumQueries(0):
+            data = self.get_token()
 
-        expiry = datetime.fromisoformat(response.data["expiry"])
-        self.assertGreater(expiry, timezone.now() - timedelta(seconds=1))
+        self.assertEqual(metric("albins_tokens_issued_total", kind="anonymous"), issued + 1)
+        expiry = datetime.fromisoformat(data["expiry"])
+        self.assertGreater(expiry, timezone.now() + timedelta(seconds=settings.TOKEN_EXPIRY - 5))
+        self.assertFalse(get_user_model().objects.exists())
+        self.assertFalse(AuthToken.objects.exists())
 
-        user = get_user_model().objects.get(username="service_account")
-        self.assertEqual(user.email, "service@example.com")
-        self.assertFalse(user.has_usable_password())
-        self.assertEqual(AuthToken.objects.filter(user=user).count(), 1)
+    def test_signed_token_reads_without_token_lookup(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.get_token()['token']}")
+        url = reverse("songs-detail", args=[self.song.id])
 
-    @override_settings(SERVICE_ACCOUNT_USERNAME="service_account", SERVICE_ACCOUNT_EMAIL="service@example.com")
-    def test_reuses_existing_service_account_and_cleans_expired_tokens(self):
-        user = get_user_model().objects.create(username="service_account", email="service@example.com")
-        user.set_unusable_password()
-        user.save(update_fields=["password"])
+        # The song row and the throttle counter; authentication adds nothing.
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
 
-        expired_token, _ = AuthToken.objects.create(user)
-        expired_token.expiry = timezone.now() - timedelta(hours=1)
-        expired_token.save(update_fields=["expiry"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["title"], "Helan går")
 
-        url = reverse("knox_anonymous_login")
-        response = self.client.post(url)
+    def test_signed_token_songbook_reads_skip_throttle_counter(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.get_token()['token']}")
+        url = reverse("songbook-detail")
+        self.client.get(url)
+
+        # Only the content version the cached book is checked against.
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(get_user_model().objects.filter(username="service_account").count(), 1)
+        self.assertFalse(ThrottleWindow.objects.exists())
+
+    @mock.patch.object(CachedReadRateThrottle, "THROTTLE_RATES", {"cached_read": "2/minute"})
+    def test_signed_token_songbook_reads_are_limited_per_address(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.get_token()['token']}")
+        url = reverse("songbook-detail")
+
+        statuses = [self.client.get(url, HTTP_X_FORWARDED_FOR="192.0.2.1").status_code for _ in range(3)]
+        other_address = self.client.get(url, HTTP_X_FORWARDED_FOR="192.0.2.2")
+
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(other_address.status_code, status.HTTP_200_OK)
+        self.assertFalse(ThrottleWindow.objects.exists())
+
+    def test_signed_token_is_read_only(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.get_token()['token']}")
+
+        response = self.client.patch(reverse("songs-detail", args=[self.song.id]), {"title": "Changed"})
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_scope_applies_to_views_that_do_not_list_it(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.get_token()['token']}")
+
+        response = self.client.post(reverse("token_usage"))
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.data["detail"], "This token only grants read access.")
+
+    def test_rejects_tampered_token(self):
+        token = self.get_token()["token"]
+        _, signature = token.rsplit(":", 1)
+        forged = signing.b64_encode(b'{"scope":"write","exp":9999999999}').decode()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {forged}:{signature}")
+
+        response = self.client.get(reverse("songs-list"))
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
-        tokens = AuthToken.objects.filter(user=user)
-        self.assertEqual(tokens.count(), 1)
-        self.assertGreater(tokens.first().expiry, timezone.now())
+    def test_rejects_expired_token(self):
+        token, _ = issue_anonymous_token(lifetime=-1)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token}")
 
-    @override_settings(SERVICE_ACCOUNT_USERNAME="", SERVICE_ACCOUNT_EMAIL="")
-    def test_missing_service_account_configuration_returns_error(self):
-        url = reverse("knox_anonymous_login")
-        response = self.client.post(url)
+        response = self.client.get(reverse("songs-list"))
 
-        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
-        self.assertEqual(response.data["detail"], "Service account not configured")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
 class LoginViewTests(APITestCase):
@@ -79,3 +141,111 @@ class LoginViewTests(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn("non_field_errors", response.data)
+
+
+class CachedTokenAuthenticationTests(APITestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(username="cached-user", password="password123")
+        _, self.token = AuthToken.objects.create(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token}")
+        self.url = reverse("songs-list")
+
+    def test_repeated_requests_skip_token_lookup(self):
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+        # The song page and the throttle counter; the token is not looked up again.
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_logout_evicts_cached_token(self):
+        self.client.get(self.url)
+
+        response = self.client.post(reverse("knox_logout"))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_token_is_evicted(self):
+        self.client.get(self.url)
+
+        AuthToken.objects.filter(user=self.user).delete()
+
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@mock.patch.object(TokenRateThrottle, "THROTTLE_RATES", {"token": "3/minute"})
+class TokenRateThrottleTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(username="throttled-user", password="password123")
+        _, token = AuthToken.objects.create(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token}")
+        self.url = reverse("songs-list")
+
+    def test_denies_requests_over_the_limit(self):
+        denials = metric("albins_throttle_denials_total", scope="token")
+        with mock.patch.object(TokenRateThrottle, "timer", lambda throttle: 6000.0):
+            statuses = [self.client.get(self.url).status_code for _ in range(4)]
+
+        self.assertEqual(statuses, [200, 200, 200, 429])
+        self.assertEqual(metric("albins_throttle_denials_total", scope="token"), denials + 1)
+        # The count is kept in the shared table and denied requests are not counted.
+        self.assertEqual(ThrottleWindow.objects.get().hits, 3)
+
+    def test_knox_token_songbook_reads_are_counted(self):
+        SongBook.objects.create(name="Counted Book")
+        with mock.patch.object(TokenRateThrottle, "timer", lambda throttle: 6000.0):
+            statuses = [self.client.get(reverse("songbook-detail")).status_code for _ in range(4)]
+
+        self.assertEqual(statuses, [200, 200, 200, 429])
+
+    def test_previous_period_counts_towards_sliding_window(self):
+        with mock.patch.object(TokenRateThrottle, "timer", lambda throttle: 6000.0):
+            for _ in range(3):
+                self.client.get(self.url)
+
+        # Ten seconds into the next minute most of the old requests still count.
+        with mock.patch.object(TokenRateThrottle, "timer", lambda throttle: 6070.0):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        with mock.patch.object(TokenRateThrottle, "timer", lambda throttle: 6100.0):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+    def test_reports_token_usage(self):
+        with mock.patch.object(TokenRateThrottle, "timer", lambda throttle: 6000.0):
+            self.client.get(self.url)
+            response = self.client.get(reverse("token_usage"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"limit": 3, "used": 2, "remaining": 1, "window": 60})
+
+
+class PurgeExpiredTokensTests(APITestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(username="gc-user", password="password123")
+        _, self.valid_token = AuthToken.objects.create(self.user)
+        for _ in range(5):
+            _, self.expired_token = AuthToken.objects.create(self.user, expiry=timedelta(hours=-1))
+
+    def test_purges_expired_tokens_in_batches(self):
+        stdout = io.StringIO()
+        with mock.patch("auth.management.commands.purge_expired_tokens.time.sleep") as sleep:
+            call_command("purge_expired_tokens", batch_size=2, pause=0, stdout=stdout)
+
+        self.assertIn("Removed 5 expired tokens", stdout.getvalue())
+        self.assertEqual(sleep.call_count, 2)
+        self.assertEqual(AuthToken.objects.count(), 1)
+
+    def test_authentication_rejects_expired_token_without_cleanup(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.expired_token}")
+        expired = metric("albins_tokens_expired_total", kind="knox")
+
+        response = self.client.get(reverse("songs-list"))
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(metric("albins_tokens_expired_total", kind="knox"), expired + 1)
+        self.assertEqual(AuthToken.objects.count(), 6)
@@ -1,14 +1,127 @@
+import hashlib
+
+from rest_framework.permissions import SAFE_METHODS
 from rest_framework.throttling import SimpleRateThrottle
 
+from albins2.metrics import THROTTLE_DENIALS
+
+from .authentication import SignedToken
+from .models import ThrottleWindow
+
+
+def token_throttle_key(scope, token):
+    """Stable, fixed-length key for a knox or signed token; None when unauthenticated."""
+    if not token:
+        return None
+    ident = getattr(token, "digest", None) or str(token)
+    return f"{scope}:{hashlib.sha256(ident.encode()).hexdigest()}"
+
+
+def is_cached_read(request, view):
+    """Whether this is a signed-token read of a view that answers from cache; see TokenRateThrottle."""
+    return (
+        isinstance(request.auth, SignedToken)
+        and request.method in SAFE_METHODS
+        and getattr(view, "serves_cached_content", False)
+    )
+
+
 class TokenRateThrottle(SimpleRateThrottle):
+    """
+    Rate-limit per authentication token, instead of per user, across all workers.
+
+    Counts live in the shared ThrottleWindow table rather than the per-process
+    cache. The sliding window is approximated from two fixed periods: the
+    previous period's count is weighted by the part of it still inside the
+    window. That is one counter row per token and period, updated by a single
+    upsert per request.
+
+    Views that set ``serves_cached_content`` are not counted for signed-token
+    reads. Anyone can mint a signed token, so a per-token count bounds little
+    there, while its upsert would be the only write, and most of the database
+    time, of a cached songbook or 304 response. CachedReadRateThrottle limits
+    those reads per client address instead. Knox tokens and every other view
+    are still counted.
+    """
+
     scope = 'token'
 
     def get_cache_key(self, request, view):
-        """
-        Rate-limit per Knox authentication token, instead of per user.
-        """
-        user_token = request.auth  # Knox token object
-        if not user_token:
-            return None  # No auth means no throttling
-
-        return f"throttle_{self.scope}_{user_token}"  # Use token as key
+        return token_throttle_key(self.scope, request.auth)
+
+    def allow_request(self, request, view):
+        if self.rate is None or is_cached_read(request, view):
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        self.period = int(self.now // self.duration)
+        self.current, self.previous = ThrottleWindow.hit(
+            self.key, self.period, expires=int((self.period + 2) * self.duration)
+        )
+        if self.estimate(self.current, self.previous) <= self.num_requests:
+            return True
+
+        # Denied requests do not use up the allowance.
+        ThrottleWindow.undo_hit(self.key, self.period)
+        THROTTLE_DENIALS.labels(scope=self.scope).inc()
+        self.current -= 1
+        return False
+
+    def estimate(self, current, previous):
+        elapsed = (self.now % self.duration) / self.duration
+        return previous * (1 - elapsed) + current
+
+    def wait(self):
+        elapsed = self.now % self.duration
+        allowance = self.num_requests - 1 - self.current
+        if allowance >= 0:
+            # Wait for enough of the previous period to slide out of the window.
+            needed = 1 - allowance / self.previous if self.previous else 0
+            return max(needed * self.duration - elapsed, 0)
+
+        # The current period alone is over the limit; it must slide out instead.
+        needed = 1 - (self.num_requests - 1) / self.current if self.current else 0
+        return self.duration - elapsed + max(needed, 0) * self.duration
+
+    def usage(self, request):
+        """Return the token's current usage without counting a request, or None when not throttled."""
+        key = self.get_cache_key(request, None)
+        if self.rate is None or key is None:
+            return None
+
+        self.now = self.timer()
+        current, previous = ThrottleWindow.counts(key, int(self.now // self.duration))
+        used = min(round(self.estimate(current, previous)), self.num_requests)
+        return {
+            "limit": self.num_requests,
+            "used": used,
+            "remaining": self.num_requests - used,
+            "window": self.duration,
+        }
+
+
+class CachedReadRateThrottle(SimpleRateThrottle):
+    """
+    Per-address limit for the cached reads TokenRateThrottle leaves uncounted.
+
+    Counts are kept in the default cache, so the check costs no query. With
+    the default LocMem cache every worker process enforces the rate on its
+    own; a shared cache backend makes it a global limit.
+    """
+
+    scope = 'cached_read'
+
+    def get_cache_key(self, request, view):
+        if not is_cached_read(request, view):
+            return None
+        return self.cache_format % {"scope": self.scope, "ident": self.get_ident(request)}
+
+    def allow_request(self, request, view):
+        if super().allow_request(request, view):
+            return True
+        THROTTLE_DENIALS.labels(scope=self.scope).inc()
+        return False
@@ -7,4 +7,5 @@ urlpatterns = [
     path('login/', views.LoginView.as_view(), name='knox_login'),
     path('logout/', knox_views.LogoutView.as_view(), name='knox_logout'),
     path('anonymous-login/', views.AnonymousTokenView.as_view(), name='knox_anonymous_login'),
+    path('usage/', views.TokenUsageView.as_view(), name='token_usage'),
 ]
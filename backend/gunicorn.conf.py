@@ -0,0 +1,46 @@
+"""
+Gunicorn settings for the API container.
+
+GUNICORN_PROFILE picks the worker model:
+
+- ``sync`` (default): WSGI with one request per worker process.
+- ``uvicorn``: ASGI through uvicorn workers. Each worker keeps serving other
+  requests while slow clients download, and the songbook/song read endpoints
+  run as async views.
+
+Workers share their Prometheus metrics through files in
+PROMETHEUS_MULTIPROC_DIR, which is emptied when gunicorn starts.
+"""
+
+import os
+import shutil
+
+profile = os.getenv("GUNICORN_PROFILE", "sync")
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("GUNICORN_WORKERS", 1))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+
+# Must be set before the workers import prometheus_client.
+metrics_dir = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/albins-metrics")
+
+if profile == "uvicorn":
+    wsgi_app = "albins2.asgi:application"
+    worker_class = "uvicorn_worker.UvicornWorker"
+    os.environ.setdefault("ASYNC_READ_VIEWS", "true")
+elif profile == "sync":
+    wsgi_app = "albins2.wsgi:application"
+else:
+    raise RuntimeError(f"Unknown GUNICORN_PROFILE {profile!r}; use 'sync' or 'uvicorn'.")
+
+
+def on_starting(server):
+    # Samples left over from a previous run would be added to the new totals.
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,128 @@
+"""
+Measure how many slow clients the API can serve at once.
+
+Opens ``--slow-clients`` connections that download the songbook at a
+trickle, like phones on a bad network, and while they are active sends
+``--probes`` ordinary requests one after another. With sync workers every
+slow download holds a worker, so probes queue behind them; uvicorn workers
+keep answering. Run it once per GUNICORN_PROFILE against the same data and
+compare the JSON it prints.
+
+The payload must be larger than the socket buffers (a few hundred KiB) for a
+slow reader to hold a worker, so seed a large book first.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import urlsplit
+
+parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+parser.add_argument("--url", default="http://localhost:8000/api/songbook/", help="Endpoint the slow clients download.")
+parser.add_argument("--probe-url", help="Endpoint timed while the slow clients are active (default: --url).")
+parser.add_argument("--token", required=True, help="API token sent as 'Authorization: Token ...'.")
+parser.add_argument("--slow-clients", type=int, default=50, help="Number of concurrent slow downloads (default: 50).")
+parser.add_argument("--chunk-size", type=int, default=4096, help="Bytes a slow client reads at a time (default: 4096).")
+parser.add_argument("--chunk-delay", type=float, default=0.05, help="Seconds between slow reads (default: 0.05).")
+parser.add_argument("--probes", type=int, default=20, help="Number of timed probe requests (default: 20).")
+parser.add_argument(
+    "--probe-timeout", type=float, default=30, help="Seconds before a probe counts as failed (default: 30)."
+)
+parser.add_argument("--label", default="", help="Free-form label copied to the output, e.g. the worker profile.")
+args = parser.parse_args()
+
+
+async def open_request(url):
+    parts = urlsplit(url)
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    path = parts.path + (f"?{parts.query}" if parts.query else "")
+    writer.write(
+        f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\nAuthorization: Token {args.token}\r\n"
+        "Connection: close\r\n\r\n".encode()
+    )
+    await writer.drain()
+    return reader, writer
+
+
+async def slow_client(started, first_bytes):
+    try:
+        reader, writer = await open_request(args.url)
+        await reader.readexactly(1)
+        first_bytes.append(time.perf_counter() - started)
+        while await reader.read(args.chunk_size):
+            await asyncio.sleep(args.chunk_delay)
+        writer.close()
+        return True
+    except (OSError, asyncio.IncompleteReadError):
+        return False
+
+
+async def fetch_status(url):
+    reader, writer = await open_request(url)
+    status_line = await reader.readline()
+    await reader.read()
+    writer.close()
+    if not status_line:
+        raise ConnectionResetError("connection closed before the status line")
+    return status_line.split()[1].decode()
+
+
+async def probe(url):
+    """
+    Return ``(seconds, status)`` for one request. A refused, reset or timed-out
+    request gives its error name as the status; a saturated server produces
+    exactly these, so they are counted rather than ending the run.
+    """
+    started = time.perf_counter()
+    try:
+        status = await asyncio.wait_for(fetch_status(url), args.probe_timeout)
+    except (OSError, asyncio.TimeoutError) as exc:
+        status = type(exc).__name__
+    return time.perf_counter() - started, status
+
+
+async def main():
+    started = time.perf_counter()
+    first_bytes = []
+    slow = [asyncio.create_task(slow_client(started, first_bytes)) for _ in range(args.slow_clients)]
+    # Let the slow clients occupy the server before probing.
+    await asyncio.sleep(1)
+
+    latencies, statuses, failures = [], [], []
+    for _ in range(args.probes):
+        latency, status = await probe(args.probe_url or args.url)
+        if status.isdigit():
+            latencies.append(latency)
+            statuses.append(status)
+        else:
+            failures.append(status)
+    probes_done = time.perf_counter() - started
+
+    completed = await asyncio.gather(*slow)
+    first_bytes.sort()
+    print(
+        json.dumps(
+            {
+                "label": args.label,
+                "slow_clients": args.slow_clients,
+                "slow_clients_completed": sum(completed),
+                "slow_first_byte_p50": statistics.median(first_bytes) if first_bytes else None,
+                "slow_first_byte_max": first_bytes[-1] if first_bytes else None,
+                "served_within_1s": sum(1 for elapsed in first_bytes if elapsed <= 1),
+                "probe_p50": statistics.median(latencies) if latencies else None,
+                "probe_max": max(latencies) if latencies else None,
+                "probe_statuses": sorted(set(statuses)),
+                "probe_failures": len(failures),
+                "probe_errors": sorted(set(failures)),
+                "probes_finished_after": probes_done,
+                "total": time.perf_counter() - started,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
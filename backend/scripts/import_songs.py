@@ -1,17 +1,39 @@
+import argparse
 import json
 import os
 import sys
 from pathlib import Path
 
 import django
-
-# Set up Django environment
-sys.path.append("/app")
-os.environ.setdefault("DJANGO_SETTINGS_MODULE", "albins2.settings")
-django.setup()
-
-from api.models import Category, Song, SongBook
-
+
+# Set up Django environment
+sys.path.append("/app")
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "albins2.settings")
+django.setup()
+
+from api.importer import bulk_import_songs, import_songs, iter_song_entries  # noqa: E402  (import after django.setup)
+from api.models import SongBook  # noqa: E402
+from api.pages import find_page_collisions  # noqa: E402
+
+parser = argparse.ArgumentParser(description="Import songs from a JSON export into the Albins songbook.")
+parser.add_argument(
+    "--bulk",
+    action="store_true",
+    help="Import in one transaction with bulk writes instead of one query per song.",
+)
+parser.add_argument(
+    "--stream",
+    action="store_true",
+    help="Parse the source (JSON array or JSON Lines) incrementally and import it in batches. Implies --bulk.",
+)
+parser.add_argument(
+    "--batch-size",
+    type=int,
+    default=500,
+    help="Number of songs written per batch in --stream mode (default: 500).",
+)
+args = parser.parse_args()
+
 # Load JSON data
 script_dir = Path(__file__).resolve().parent
 env_source = os.environ.get("ALBINS_SONG_SOURCE")
@@ -23,61 +45,22 @@ if env_source:
 else:
     json_path = script_dir / "songs.json"
 
-with json_path.open("r", encoding="utf-8") as f:
-    songs_data = json.load(f)
-
-# Get or create the songbook
-songbook_name = "Albins"
-songbook, _ = SongBook.objects.get_or_create(name=songbook_name)
-
-# Process each song in the JSON file
-for song_entry in songs_data:
-    category_name = song_entry["category"]
-    category, _ = Category.objects.get_or_create(name=category_name, songbook=songbook)
-
-    content = song_entry["text"].replace('\n', '</p><p>')
-    content = f"<p>{content}</p>"
+songbook_name = "Albins"
 
-    raw_page = (
-        song_entry.get("page_number")
-        or song_entry.get("page")
-        or song_entry.get("pageNumber")
-    )
-    raw_negative_page = (
-        song_entry.get("negative_page_number")
-        or song_entry.get("flipped_page_number")
-        or song_entry.get("flippedPageNumber")
-    )
-
-    page_number = None
-    negative_page_number = None
-
-    if raw_page is not None:
-        try:
-            page_number = abs(int(raw_page))
-        except (TypeError, ValueError):
-            page_number = None
-
-    if raw_negative_page is not None:
-        try:
-            negative_page_number = -abs(int(raw_negative_page))
-        except (TypeError, ValueError):
-            negative_page_number = None
-
-    defaults = {
-        "melody": song_entry.get("melody", ""),
-        "author": "",
-        "content": content,
-        "category": category,
-        "order": None,
-        "page_number": page_number,
-        "negative_page_number": negative_page_number,
-    }
+if args.stream:
+    with json_path.open("r", encoding="utf-8") as f:
+        stats = bulk_import_songs(iter_song_entries(f), songbook_name=songbook_name, batch_size=args.batch_size)
+    print(f"Songs successfully imported: {stats}.")
+else:
+    with json_path.open("r", encoding="utf-8") as f:
+        songs_data = json.load(f)
 
-    song, _ = Song.objects.update_or_create(
-        title=song_entry["title"],
-        category=category,
-        defaults=defaults,
-    )
+    if args.bulk:
+        stats = bulk_import_songs(songs_data, songbook_name=songbook_name)
+        print(f"Songs successfully imported: {stats}.")
+    else:
+        import_songs(songs_data, songbook_name=songbook_name)
+        print("Songs successfully imported!")
 
-print("Songs successfully imported!")
+for page, titles in find_page_collisions(SongBook.objects.get(name=songbook_name)):
+    print(f"Warning: page {page} is shared by {', '.join(titles)}")
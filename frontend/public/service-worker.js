@@ -131,9 +131,14 @@ async function handleAssetRequest(request) {
 
 async function handleSongbookRequest(request) {
   const cache = await caches.open(RUNTIME_CACHE);
+  const cachedBook = await cache.match(request);
 
   try {
-    const networkResponse = await fetch(request);
+    const networkResponse = await fetch(withSongbookValidators(request, cachedBook));
+    if (networkResponse && networkResponse.status === 304 && cachedBook) {
+      return cachedBook;
+    }
+
     if (networkResponse && networkResponse.ok) {
       await cache.put(request, networkResponse.clone());
       await trimCache(cache);
@@ -143,9 +148,8 @@ async function handleSongbookRequest(request) {
     // Swallow network errors so we can fall back to cache.
   }
 
-  const cached = await cache.match(request);
-  if (cached) {
-    return cached;
+  if (cachedBook) {
+    return cachedBook;
   }
 
   return new Response(JSON.stringify({ id: OFFLINE_SONGBOOK_ID, name: OFFLINE_SONGBOOK_NAME, categories: [] }), {
@@ -155,6 +159,18 @@ async function handleSongbookRequest(request) {
   });
 }
 
+function withSongbookValidators(request, cachedBook) {
+  const etag = cachedBook?.headers.get('ETag');
+  if (!etag) {
+    return request;
+  }
+
+  // Revalidate the offline copy so an unchanged book costs a 304 instead of a full download.
+  const headers = new Headers(request.headers);
+  headers.set('If-None-Match', etag);
+  return new Request(request, { headers, cache: 'no-store' });
+}
+
 async function cacheRuntimeResponse(request, response) {
   if (!response || !response.ok) {
     return;